@@ -971,7 +971,10 @@ class EnhancedImageVariationProcessor(ImageVariationProcessor):
         # 메모리 최적화
         original_image = Image.open(image_path)
         if self.memory_optimizer:
-            optimized_image = self.memory_optimizer.optimize_image_size(original_image)
+            # 최적화용으로만 연 이미지이므로 제자리 축소 (원본·사본을 동시에 들고 있지 않음)
+            optimized_image = self.memory_optimizer.optimize_image_size(
+                original_image, copy_on_resize=False
+            )
         else:
             optimized_image = original_image
         
@@ -1167,6 +1170,6 @@ class EnhancedImageVariationProcessor(ImageVariationProcessor):
         
         if self.quality_manager:
             stats['current_quality_level'] = self.quality_manager.current_quality_level
-            stats['success_rate_history'] = self.quality_manager.success_rate_history[-10:]  # 최근 10개
+            stats['success_rate_history'] = list(self.quality_manager.success_rate_history)  # 최근 5개
         
         return stats
\ No newline at end of file
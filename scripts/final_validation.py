@@ -73,7 +73,6 @@ class FinalValidator:
         
         optional_deps = {
             'cv2': 'opencv-python',
-            'skimage': 'scikit-image', 
             'imagehash': 'imagehash',
             'psutil': 'psutil',
             'pytest': 'pytest'
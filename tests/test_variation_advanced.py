@@ -4,19 +4,36 @@ Tests for advanced image variation features
 고급 이미지 변형 기능 테스트
 """
 
+import sys
 import unittest
-import tempfile
+import importlib.util
 import os
-import json
+import shutil
+import tempfile
+from unittest import mock
 from pathlib import Path
 from PIL import Image
-import sys
 
-# Add project root to path for imports
-project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root))
+# Direct runs (python tests/<file>.py) don't get pytest's pythonpath setting,
+# so add the project root for them only
+if __name__ == '__main__':
+    _project_root = str(Path(__file__).resolve().parent.parent)
+    if _project_root not in sys.path:
+        sys.path.insert(0, _project_root)
+
+# The actual imports happen in setUpClass, so skipped classes never pay for them.
+# Only numpy is optional; variation_advanced is part of this repo, so a failed
+# import of it is reported as an error instead of skipping every test.
+ADVANCED_FEATURES_AVAILABLE = importlib.util.find_spec('numpy') is not None
+if not ADVANCED_FEATURES_AVAILABLE:
+    print("Advanced features not available: numpy missing")
 
-try:
+
+def _load_advanced_features():
+    """Import the optional advanced feature modules into this module's namespace"""
+    global np, VariationQualityAnalyzer, DuplicationPreventer, MemoryOptimizer
+    global VariationCache, RetryManager, AdaptiveQualityManager, EnhancedImageVariationProcessor
+    import numpy as np
     from variation_advanced import (
         VariationQualityAnalyzer,
         DuplicationPreventer, 
@@ -26,24 +43,77 @@ try:
         AdaptiveQualityManager
     )
     from batch_nanobanana_core import EnhancedImageVariationProcessor
-    ADVANCED_FEATURES_AVAILABLE = True
-except ImportError as e:
-    print(f"Advanced features not available: {e}")
-    ADVANCED_FEATURES_AVAILABLE = False
+
+
+class AdvancedFeaturesTestCase(unittest.TestCase):
+    """Base class that loads the advanced feature modules once per test class"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _load_advanced_features()
+
+
+_COLORS = {
+    'red': b'\xff\x00\x00',
+    'blue': b'\x00\x00\xff',
+    'green': b'\x00\x80\x00',  # PIL's named 'green' is (0, 128, 0)
+}
+
+
+_PROTOTYPES = {}
+
+
+def _solid(size, color):
+    """Build a solid-color RGB image from a single repeated byte pattern"""
+    return Image.frombytes('RGB', size, _COLORS[color] * (size[0] * size[1]))
+
+
+def _proto(size, color):
+    """Shared read-only solid-color image; call .copy() before mutating it"""
+    key = (size, color)
+    if key not in _PROTOTYPES:
+        _PROTOTYPES[key] = _solid(size, color)
+    return _PROTOTYPES[key]
+
+
+def _fractal(size, color, rotated=False):
+    """Single-channel Mandelbrot image; perceptual hashes need structure, not flat color"""
+    pattern = Image.effect_mandelbrot(size, (-2, -1.5, 1, 1.5), 64)
+    if rotated:
+        pattern = pattern.transpose(Image.Transpose.ROTATE_90)
+    blank = Image.new('L', size, 0)
+    bands = {'red': (pattern, blank, blank), 'blue': (blank, blank, pattern)}[color]
+    return Image.merge('RGB', bands)
+
+
+def _make_empty_files(directory: Path, names):
+    """Create empty placeholder files (content is irrelevant to the caller)"""
+    for name in names:
+        (directory / name).touch()
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestVariationQualityAnalyzer(unittest.TestCase):
+class TestVariationQualityAnalyzer(AdvancedFeaturesTestCase):
     """Test variation quality analyzer"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Pre-stack the comparison images once for the whole class"""
+        super().setUpClass()
+        others = [_proto((100, 100), 'blue'), _proto((100, 100), 'green')]
+        cls._others = np.empty((len(others), 100, 100, 3), dtype=np.uint8)
+        for i, img in enumerate(others):
+            cls._others[i] = np.asarray(img)
+    
     def setUp(self):
         """Set up test fixtures"""
         self.analyzer = VariationQualityAnalyzer()
         
         # Create test images
-        self.test_image1 = Image.new('RGB', (100, 100), 'red')
-        self.test_image2 = Image.new('RGB', (100, 100), 'blue')
-        self.test_image3 = Image.new('RGB', (100, 100), 'green')
+        self.test_image1 = _proto((100, 100), 'red')
+        self.test_image2 = _proto((100, 100), 'blue')
+        self.test_image3 = _proto((100, 100), 'green')
     
     def test_initialization(self):
         """Test proper initialization"""
@@ -65,47 +135,142 @@ class TestVariationQualityAnalyzer(unittest.TestCase):
         self.assertGreaterEqual(similarity_diff, 0.0)
         self.assertLessEqual(similarity_diff, 1.0)
     
+    def test_calculate_similarity_ssim(self):
+        """Test block-sum SSIM similarity"""
+        similarity_same = self.analyzer._calculate_similarity_ssim(self.test_image1, self.test_image1)
+        self.assertAlmostEqual(similarity_same, 1.0)
+        
+        # Different sizes are resampled to a common size
+        similarity_diff = self.analyzer._calculate_similarity_ssim(
+            self.test_image1, _proto((50, 50), 'blue')
+        )
+        self.assertLess(similarity_diff, similarity_same)
+        self.assertGreaterEqual(similarity_diff, 0.0)
+    
+    def test_similarity_metric_selection(self):
+        """Test that use_ssim picks the SSIM path and the default stays on histograms"""
+        ssim_analyzer = VariationQualityAnalyzer(use_ssim=True)
+        with mock.patch.object(ssim_analyzer, '_calculate_similarity_ssim', return_value=0.42) as ssim:
+            self.assertEqual(ssim_analyzer.calculate_similarity(self.test_image1, self.test_image2), 0.42)
+        ssim.assert_called_once()
+        
+        with mock.patch.object(self.analyzer, '_calculate_similarity_ssim') as ssim:
+            self.analyzer.calculate_similarity(self.test_image1, self.test_image2)
+        ssim.assert_not_called()
+    
+    def test_calculate_diversity_stack_is_vectorized(self):
+        """Test that array stacks use the batched histogram path, not per-image conversion"""
+        with mock.patch.object(self.analyzer, 'calculate_similarity') as per_image:
+            diversity = self.analyzer.calculate_diversity(self.test_image1, self._others)
+        per_image.assert_not_called()
+        self.assertGreaterEqual(diversity, 0.0)
+        self.assertLessEqual(diversity, 1.0)
+    
+    def test_gray_array_cached_per_image(self):
+        """Test that the grayscale plane is converted once and shared read-only"""
+        from variation_advanced import _as_gray
+        
+        image = _solid((20, 20), 'red')
+        gray = _as_gray(image)
+        
+        self.assertIs(_as_gray(image), gray)
+        self.assertFalse(gray.flags.writeable)
+        self.assertEqual(gray.shape, (20, 20))
+    
+    def test_luma_stats_match_numpy(self):
+        """Test histogram-derived luma statistics against direct reductions"""
+        from variation_advanced import _luma_stats
+        
+        gray = np.random.default_rng(1).integers(0, 256, (40, 60), dtype=np.uint8)
+        mean, std, hist = _luma_stats(gray)
+        
+        self.assertAlmostEqual(mean, float(gray.mean()))
+        self.assertAlmostEqual(std, float(gray.std()))
+        self.assertEqual(hist.sum(), gray.size)
+    
+    def test_sobel_edge_ratio(self):
+        """Test the fused Sobel edge ratio on a single vertical step edge"""
+        from variation_advanced import _sobel_edge_ratio
+        
+        gray = np.zeros((10, 10), dtype=np.uint8)
+        gray[:, 5:] = 255
+        
+        # The two interior columns touching the step are edges: 2 of 8
+        self.assertAlmostEqual(_sobel_edge_ratio(gray), 0.25)
+        self.assertEqual(_sobel_edge_ratio(np.zeros((10, 10), dtype=np.uint8)), 0.0)
+    
+    def test_gray_features_match_separate_passes(self):
+        """Test the combined luma/edge features against the individual helpers"""
+        from variation_advanced import _gray_features, _luma_stats, _sobel_edge_ratio
+        
+        image = _fractal((40, 40), 'red')
+        gray = np.asarray(image.convert('L'))
+        mean, std, _ = _luma_stats(gray)
+        
+        self.assertEqual(_gray_features(image), (mean, std, _sobel_edge_ratio(gray)))
+    
     def test_calculate_diversity(self):
         """Test diversity calculation"""
-        other_images = [self.test_image2, self.test_image3]
-        diversity = self.analyzer.calculate_diversity(self.test_image1, other_images)
+        diversity = self.analyzer.calculate_diversity(self.test_image1, self._others)
         
         self.assertIsInstance(diversity, float)
         self.assertGreaterEqual(diversity, 0.0)
         self.assertLessEqual(diversity, 1.0)
         
+        # Stacked array and image list should agree
+        other_images = [self.test_image2, self.test_image3]
+        diversity_list = self.analyzer.calculate_diversity(self.test_image1, other_images)
+        self.assertAlmostEqual(diversity, diversity_list)
+        
         # Empty list should return max diversity
         diversity_empty = self.analyzer.calculate_diversity(self.test_image1, [])
         self.assertEqual(diversity_empty, 1.0)
     
-    def test_analyze_aesthetic_quality(self):
-        """Test aesthetic quality analysis"""
-        aesthetic_score = self.analyzer.analyze_aesthetic_quality(self.test_image1)
+    def test_calculate_diversity_samples_large_sets(self):
+        """Test that diversity compares against at most diversity_sample_size images"""
+        others = [self.test_image2] * 20
+        
+        with mock.patch.object(self.analyzer, 'calculate_similarity',
+                               return_value=0.25) as similarity:
+            diversity = self.analyzer.calculate_diversity(self.test_image1, others)
         
-        self.assertIsInstance(aesthetic_score, float)
-        self.assertGreaterEqual(aesthetic_score, 0.0)
-        self.assertLessEqual(aesthetic_score, 1.0)
+        self.assertEqual(similarity.call_count, self.analyzer.diversity_sample_size)
+        self.assertAlmostEqual(diversity, 0.75)
     
-    def test_verify_object_integrity(self):
-        """Test object integrity verification"""
-        integrity_score = self.analyzer.verify_object_integrity(self.test_image1)
+    def test_all_quality_metrics(self):
+        """Test aesthetic, integrity and comprehensive quality analysis"""
+        with self.subTest(metric='aesthetic'):
+            aesthetic_score = self.analyzer.analyze_aesthetic_quality(self.test_image1)
+            
+            self.assertIsInstance(aesthetic_score, float)
+            self.assertGreaterEqual(aesthetic_score, 0.0)
+            self.assertLessEqual(aesthetic_score, 1.0)
         
-        self.assertIsInstance(integrity_score, float)
-        self.assertGreaterEqual(integrity_score, 0.0)
-        self.assertLessEqual(integrity_score, 1.0)
+        with self.subTest(metric='object_integrity'):
+            integrity_score = self.analyzer.verify_object_integrity(self.test_image1)
+            
+            self.assertIsInstance(integrity_score, float)
+            self.assertGreaterEqual(integrity_score, 0.0)
+            self.assertLessEqual(integrity_score, 1.0)
+        
+        with self.subTest(metric='variation_quality'):
+            quality_metrics = self.analyzer.analyze_variation_quality(
+                self.test_image1, self.test_image2, self._others[1:]
+            )
+            
+            required_metrics = ['similarity', 'diversity', 'aesthetic', 'object_integrity', 'overall_quality']
+            for metric in required_metrics:
+                self.assertIn(metric, quality_metrics)
+                self.assertIsInstance(quality_metrics[metric], float)
+                self.assertGreaterEqual(quality_metrics[metric], 0.0)
+                self.assertLessEqual(quality_metrics[metric], 1.0)
     
-    def test_analyze_variation_quality(self):
-        """Test comprehensive quality analysis"""
-        quality_metrics = self.analyzer.analyze_variation_quality(
-            self.test_image1, self.test_image2, [self.test_image3]
-        )
+    def test_calculate_overall_quality(self):
+        """Test the weighted overall score"""
+        metrics = {'similarity': 0.6, 'diversity': 0.5, 'aesthetic': 0.5, 'object_integrity': 0.5}
         
-        required_metrics = ['similarity', 'diversity', 'aesthetic', 'object_integrity', 'overall_quality']
-        for metric in required_metrics:
-            self.assertIn(metric, quality_metrics)
-            self.assertIsInstance(quality_metrics[metric], float)
-            self.assertGreaterEqual(quality_metrics[metric], 0.0)
-            self.assertLessEqual(quality_metrics[metric], 1.0)
+        # Ideal similarity scores 1.0: 0.2 * 1.0 + (0.3 + 0.3 + 0.2) * 0.5
+        self.assertAlmostEqual(self.analyzer.calculate_overall_quality(metrics), 0.6)
     
     def test_is_acceptable_quality(self):
         """Test quality acceptance criteria"""
@@ -131,7 +296,7 @@ class TestVariationQualityAnalyzer(unittest.TestCase):
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestDuplicationPreventer(unittest.TestCase):
+class TestDuplicationPreventer(AdvancedFeaturesTestCase):
     """Test duplication prevention system"""
     
     def setUp(self):
@@ -139,9 +304,9 @@ class TestDuplicationPreventer(unittest.TestCase):
         self.preventer = DuplicationPreventer()
         
         # Create test images
-        self.test_image1 = Image.new('RGB', (50, 50), 'red')
-        self.test_image2 = Image.new('RGB', (50, 50), 'blue')
-        self.test_image1_copy = Image.new('RGB', (50, 50), 'red')
+        self.test_image1 = _fractal((50, 50), 'red')
+        self.test_image2 = _fractal((50, 50), 'blue', rotated=True)
+        self.test_image1_copy = _fractal((50, 50), 'red')
     
     def test_initialization(self):
         """Test proper initialization"""
@@ -155,10 +320,20 @@ class TestDuplicationPreventer(unittest.TestCase):
         hash2 = self.preventer.calculate_image_hash(self.test_image2)
         hash1_copy = self.preventer.calculate_image_hash(self.test_image1_copy)
         
-        self.assertIsInstance(hash1, str)
+        self.assertIsInstance(hash1, int)
         self.assertNotEqual(hash1, hash2)  # Different images should have different hashes
         self.assertEqual(hash1, hash1_copy)  # Same images should have same hashes
     
+    def test_calculate_image_hash_from_array(self):
+        """Test image hash calculation from a NumPy array view"""
+        image1_array = np.asarray(self.test_image1)
+        
+        hash_from_array = self.preventer.calculate_image_hash(image1_array)
+        hash_from_image = self.preventer.calculate_image_hash(self.test_image1)
+        
+        self.assertEqual(hash_from_array, hash_from_image)
+        self.assertNotEqual(hash_from_array, self.preventer.calculate_image_hash(np.asarray(self.test_image2)))
+    
     def test_add_variation(self):
         """Test adding variations"""
         # First image should be added successfully
@@ -177,15 +352,80 @@ class TestDuplicationPreventer(unittest.TestCase):
         self.assertEqual(len(self.preventer.generated_variations), 2)
     
     def test_is_duplicate(self):
-        """Test duplicate detection"""
-        # Add first image
+        """Test duplicate detection with both the flat uint64 scan and the BK-tree"""
+        for flat_scan in (True, False):
+            with self.subTest(flat_scan=flat_scan):
+                preventer = DuplicationPreventer()
+                preventer._flat_scan = flat_scan
+                
+                # Add first image
+                preventer.add_variation(self.test_image1)
+                
+                # Different image should not be duplicate
+                self.assertFalse(preventer.is_duplicate(self.test_image2))
+                
+                # Same image should be duplicate
+                self.assertTrue(preventer.is_duplicate(self.test_image1_copy))
+    
+    def test_hash_tree_matches_linear_scan(self):
+        """Test BK-tree radius search against a brute-force Hamming scan"""
+        from variation_advanced import _BKTree, _hamming_distance
+        
+        rng = np.random.default_rng(0)
+        hashes = [int(h) for h in rng.integers(0, 2 ** 63, size=200, dtype=np.int64)]
+        hashes += [hashes[0] ^ (1 << bit) ^ (1 << (bit + 20)) for bit in range(30)]
+        tree = _BKTree()
+        for index, image_hash in enumerate(hashes):
+            tree.add(image_hash, index)
+        
+        query = hashes[0] ^ 0b1011  # distance 3 from the first hash
+        expected = sorted(
+            (_hamming_distance(query, h), i) for i, h in enumerate(hashes)
+            if _hamming_distance(query, h) <= 8
+        )
+        self.assertEqual(sorted(tree.find(query, 8)), expected)
+    
+    def test_popcount64_swar_matches_python(self):
+        """Test the SWAR popcount fallback against Python bit counting"""
+        from variation_advanced import _popcount64, _popcount64_swar
+        
+        values = np.random.default_rng(0).integers(0, 2 ** 63, size=100, dtype=np.int64)
+        values = values.astype(np.uint64) << np.uint64(1) | np.uint64(1)  # use all 64 bits
+        expected = [bin(int(v)).count('1') for v in values]
+        
+        self.assertEqual(_popcount64_swar(values).tolist(), expected)
+        self.assertEqual(np.asarray(_popcount64(values)).tolist(), expected)
+    
+    def test_is_duplicate_checks_only_hash_candidates(self):
+        """Test that the SSIM pass skips images outside the hash radius"""
         self.preventer.add_variation(self.test_image1)
         
-        # Different image should not be duplicate
-        self.assertFalse(self.preventer.is_duplicate(self.test_image2))
+        with mock.patch.object(VariationQualityAnalyzer, 'calculate_similarity',
+                               return_value=0.0) as similarity:
+            self.preventer.is_duplicate(self.test_image2)  # hash distance 20 > 8
+        
+        similarity.assert_not_called()
+    
+    def test_batch_add(self):
+        """Test batch registration matches one-by-one registration"""
+        images = [self.test_image1, self.test_image2, self.test_image1_copy]
+        
+        self.assertEqual(self.preventer.batch_add(images), [True, True, False])
+        self.assertEqual(len(self.preventer.generated_variations), 2)
+        
+        hashes = self.preventer.batch_hash(images)
+        self.assertEqual(hashes, [self.preventer.calculate_image_hash(image) for image in images])
+    
+    def test_batch_hash_follows_hash_family(self):
+        """Test that batch_hash uses the same hash family as calculate_image_hash"""
+        import variation_advanced
         
-        # Same image should be duplicate
-        self.assertTrue(self.preventer.is_duplicate(self.test_image1_copy))
+        wide_hash = 1 << 150  # stands in for a 192-bit imagehash value
+        with mock.patch.object(variation_advanced, 'HAS_IMAGEHASH', True), \
+                mock.patch.object(DuplicationPreventer, '_calculate_image_hash_advanced',
+                                  return_value=wide_hash):
+            self.assertEqual(self.preventer.batch_hash([self.test_image1, self.test_image2]),
+                             [wide_hash, wide_hash])
     
     def test_clear(self):
         """Test clearing variations"""
@@ -201,7 +441,7 @@ class TestDuplicationPreventer(unittest.TestCase):
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestMemoryOptimizer(unittest.TestCase):
+class TestMemoryOptimizer(AdvancedFeaturesTestCase):
     """Test memory optimizer"""
     
     def setUp(self):
@@ -215,13 +455,23 @@ class TestMemoryOptimizer(unittest.TestCase):
     
     def test_optimize_image_size(self):
         """Test image size optimization"""
-        # Large image that should be resized
+        # Large image that should be resized (as a new image by default)
         large_image = Image.new('RGB', (4000, 3000), 'red')
         optimized = self.optimizer.optimize_image_size(large_image, max_dimension=2048)
         
         # Should be resized
         self.assertLessEqual(max(optimized.size), 2048)
         self.assertLess(optimized.size[0] * optimized.size[1], large_image.size[0] * large_image.size[1])
+        self.assertEqual(large_image.size, (4000, 3000))
+        
+        # In-place resizing drops per-image caches computed at the old size
+        from variation_advanced import _as_gray
+        owned = Image.new('RGB', (4000, 3000), 'red')
+        self.assertEqual(_as_gray(owned).shape, (3000, 4000))
+        shrunk = self.optimizer.optimize_image_size(owned, max_dimension=2048, copy_on_resize=False)
+        self.assertIs(shrunk, owned)
+        self.assertEqual(owned.size, (2048, 1536))
+        self.assertEqual(_as_gray(owned).shape, (1536, 2048))
         
         # Small image should not be resized
         small_image = Image.new('RGB', (100, 100), 'blue')
@@ -242,14 +492,24 @@ class TestMemoryOptimizer(unittest.TestCase):
         optimal_size_large = self.optimizer.manage_batch_memory(1000, image_sizes)
         self.assertLess(optimal_size_large, 1000)
     
+    def test_manage_batch_memory_respects_available_memory(self):
+        """Test that low system memory shrinks the batch below the configured cap"""
+        image_sizes = [(1000, 1000)]  # ~11.4 MB per image, ~23 MB per batch slot
+        fake_psutil = mock.Mock()
+        fake_psutil.virtual_memory.return_value.available = (512 + 100) * 1024 * 1024
+        
+        with mock.patch('variation_advanced.HAS_PSUTIL', True), \
+                mock.patch('variation_advanced.psutil', fake_psutil, create=True):
+            self.assertEqual(self.optimizer.available_memory_mb(), 100)
+            self.assertEqual(self.optimizer.manage_batch_memory(50, image_sizes), 4)
+    
     def test_cleanup_temp_files(self):
         """Test temp file cleanup"""
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
             # Create some temp files
-            (temp_path / "test1.txt").write_text("test")
-            (temp_path / "test2.txt").write_text("test")
+            _make_empty_files(temp_path, ["test1.txt", "test2.txt"])
             
             # Directory should exist and have files
             self.assertTrue(temp_path.exists())
@@ -260,22 +520,41 @@ class TestMemoryOptimizer(unittest.TestCase):
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestVariationCache(unittest.TestCase):
+class TestVariationCache(AdvancedFeaturesTestCase):
     """Test variation cache system"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Encode the input image once for the whole class"""
+        super().setUpClass()
+        cls._td = tempfile.TemporaryDirectory()
+        cls._canonical_png = Path(cls._td.name) / 'canonical.png'
+        _proto((100, 100), 'red').save(cls._canonical_png, 'PNG', compress_level=0)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the shared input image"""
+        cls._td.cleanup()
+    
     def setUp(self):
         """Set up test fixtures"""
         self.temp_dir = tempfile.mkdtemp()
         self.cache = VariationCache(cache_dir=Path(self.temp_dir) / 'cache')
         
-        # Create test image
+        # No test inspects the on-disk index, so skip writing it on every operation
+        index_patcher = mock.patch.object(self.cache, 'save_cache_index')
+        index_patcher.start()
+        self.addCleanup(index_patcher.stop)
+        
+        # Link the shared test image (copy if hardlinks are unavailable)
         self.test_image_path = Path(self.temp_dir) / 'test.png'
-        test_image = Image.new('RGB', (100, 100), 'red')
-        test_image.save(self.test_image_path)
+        try:
+            os.link(self._canonical_png, self.test_image_path)
+        except OSError:
+            shutil.copyfile(self._canonical_png, self.test_image_path)
     
     def tearDown(self):
         """Clean up test fixtures"""
-        import shutil
         if Path(self.temp_dir).exists():
             shutil.rmtree(self.temp_dir)
     
@@ -308,9 +587,9 @@ class TestVariationCache(unittest.TestCase):
         result_path1 = Path(self.temp_dir) / 'result1.png'
         result_path2 = Path(self.temp_dir) / 'result2.png'
         
-        test_image = Image.new('RGB', (50, 50), 'blue')
-        test_image.save(result_path1)
-        test_image.save(result_path2)
+        test_image = _proto((50, 50), 'blue')
+        test_image.save(result_path1, 'PNG', compress_level=0)
+        test_image.save(result_path2, 'PNG', compress_level=0)
         
         cache_key = 'test_key_123'
         params = {'variation_type': 'random'}
@@ -334,6 +613,23 @@ class TestVariationCache(unittest.TestCase):
         self.assertEqual(len(cached_results), 2)
         self.assertTrue(all(path.exists() for path in cached_results))
     
+    def test_cleanup_evicts_by_recorded_size(self):
+        """Test eviction uses per-entry sizes, scanning only entries without one"""
+        for cache_key in ('old', 'new'):
+            entry_dir = self.cache.cache_dir / cache_key
+            entry_dir.mkdir()
+            (entry_dir / 'variation_0.png').write_bytes(b'\0' * 1024)
+        self.cache.cache_index = {
+            'old': {'results': [], 'last_used': '2024-01-01T00:00:00'},
+            'new': {'results': [], 'last_used': '2024-06-01T00:00:00', 'size_bytes': 1024},
+        }
+        self.cache.max_cache_size_gb = 1536 / (1024**3)  # room for one entry
+        
+        self.cache.cleanup_old_cache()
+        
+        self.assertEqual(list(self.cache.cache_index), ['new'])
+        self.assertFalse((self.cache.cache_dir / 'old').exists())
+    
     def test_cache_miss(self):
         """Test cache miss behavior"""
         result = self.cache.get_cached_result('nonexistent_key')
@@ -341,7 +637,7 @@ class TestVariationCache(unittest.TestCase):
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestRetryManager(unittest.TestCase):
+class TestRetryManager(AdvancedFeaturesTestCase):
     """Test retry manager"""
     
     def setUp(self):
@@ -392,10 +688,13 @@ class TestRetryManager(unittest.TestCase):
         
         self.assertFalse(self.retry_manager.is_non_retryable_error(retryable_error))
         self.assertTrue(self.retry_manager.is_non_retryable_error(non_retryable_error))
+        
+        # Matching is case-insensitive
+        self.assertTrue(self.retry_manager.is_non_retryable_error(Exception("Quota Exceeded")))
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestAdaptiveQualityManager(unittest.TestCase):
+class TestAdaptiveQualityManager(AdvancedFeaturesTestCase):
     """Test adaptive quality manager"""
     
     def setUp(self):
@@ -416,18 +715,36 @@ class TestAdaptiveQualityManager(unittest.TestCase):
         self.assertEqual(self.quality_manager.current_quality_level, 'high')
         
         # Poor performance should lower quality
-        for _ in range(5):
-            self.quality_manager.adjust_quality_based_on_performance(0.3)
+        self.quality_manager.adjust_quality_based_on_performance_batch(np.full(5, 0.3))
         
         # Should have adjusted to medium or low
         self.assertIn(self.quality_manager.current_quality_level, ['medium', 'low'])
         
         # Good performance should restore quality
-        for _ in range(5):
-            self.quality_manager.adjust_quality_based_on_performance(0.9)
+        self.quality_manager.adjust_quality_based_on_performance_batch(np.full(5, 0.9))
         
         self.assertEqual(self.quality_manager.current_quality_level, 'high')
     
+    def test_quality_adjustment_batch_matches_sequential(self):
+        """Test batched adjustment follows the same transitions as single calls"""
+        rates = [0.4, 0.2, 0.1, 0.2, 0.3, 0.1, 0.2, 0.9, 0.9, 0.9, 0.9, 0.9]
+        sequential = AdaptiveQualityManager()
+        levels = []
+        for rate in rates:
+            sequential.adjust_quality_based_on_performance(rate)
+            levels.append(sequential.current_quality_level)
+        
+        self.assertIn('low', levels)
+        self.quality_manager.adjust_quality_based_on_performance_batch(np.array(rates[:3]))
+        self.quality_manager.adjust_quality_based_on_performance_batch(np.array(rates[3:7]))
+        self.assertEqual(self.quality_manager.current_quality_level, levels[6])
+        self.quality_manager.adjust_quality_based_on_performance_batch(np.array(rates[7:]))
+        self.assertEqual(self.quality_manager.current_quality_level, sequential.current_quality_level)
+        
+        # History keeps only the last five rates however many were reported
+        self.assertEqual(list(self.quality_manager.success_rate_history), rates[-5:])
+        self.assertEqual(list(sequential.success_rate_history), rates[-5:])
+    
     def test_get_current_settings(self):
         """Test getting current quality settings"""
         settings = self.quality_manager.get_current_settings()
@@ -444,9 +761,23 @@ class TestAdaptiveQualityManager(unittest.TestCase):
 
 
 @unittest.skipUnless(ADVANCED_FEATURES_AVAILABLE, "Advanced features not available")
-class TestEnhancedImageVariationProcessor(unittest.TestCase):
+class TestEnhancedImageVariationProcessor(AdvancedFeaturesTestCase):
     """Test enhanced image variation processor"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create the read-only test image once for the whole class"""
+        super().setUpClass()
+        cls._shared_td = tempfile.TemporaryDirectory()
+        cls._shared_image_path = Path(cls._shared_td.name) / "test_image.png"
+        test_image = _proto((200, 200), 'green')
+        test_image.save(cls._shared_image_path, 'PNG', compress_level=0)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up shared test fixtures"""
+        cls._shared_td.cleanup()
+    
     def setUp(self):
         """Set up test fixtures"""
         # Use a dummy API key for testing
@@ -457,19 +788,7 @@ class TestEnhancedImageVariationProcessor(unittest.TestCase):
             enable_duplication_prevention=True
         )
         
-        # Create a temporary directory for test files
-        self.temp_dir = Path(tempfile.mkdtemp())
-        
-        # Create a test image
-        self.test_image_path = self.temp_dir / "test_image.png"
-        test_image = Image.new('RGB', (200, 200), 'green')
-        test_image.save(self.test_image_path)
-    
-    def tearDown(self):
-        """Clean up test fixtures"""
-        import shutil
-        if self.temp_dir.exists():
-            shutil.rmtree(self.temp_dir)
+        self.test_image_path = self._shared_image_path
     
     def test_initialization(self):
         """Test proper initialization"""
@@ -502,4 +821,4 @@ class TestEnhancedImageVariationProcessor(unittest.TestCase):
 
 
 if __name__ == '__main__':
-    unittest.main(verbosity=2)
\ No newline at end of file
+    unittest.main(verbosity=1, buffer=True)
\ No newline at end of file
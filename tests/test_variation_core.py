@@ -3,16 +3,20 @@
 Unit tests for image variation functionality
 """
 
+import sys
 import unittest
 import tempfile
 import os
+from io import BytesIO
 from pathlib import Path
 from PIL import Image
-import sys
 
-# Add project root to path for imports
-project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root))
+# Direct runs (python tests/<file>.py) don't get pytest's pythonpath setting,
+# so add the project root for them only
+if __name__ == '__main__':
+    _project_root = str(Path(__file__).resolve().parent.parent)
+    if _project_root not in sys.path:
+        sys.path.insert(0, _project_root)
 
 from batch_nanobanana_core import (
     VariationPromptGenerator,
@@ -24,9 +28,10 @@ from batch_nanobanana_core import (
 class TestVariationPromptGenerator(unittest.TestCase):
     """Test the variation prompt generator"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.generator = VariationPromptGenerator()
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures (the generator is read-only, so share it)"""
+        cls.generator = VariationPromptGenerator()
     
     def test_initialization(self):
         """Test proper initialization"""
@@ -47,11 +52,12 @@ class TestVariationPromptGenerator(unittest.TestCase):
                           'object_remove', 'style_change', 'composition']
         
         for variation_type in variation_types:
-            prompt = self.generator.generate_prompt(variation_type, seed=42)
-            
-            self.assertIsInstance(prompt, str)
-            self.assertGreater(len(prompt), 10)  # Should be meaningful length
-            self.assertNotEqual(prompt.strip(), "")
+            with self.subTest(variation_type=variation_type):
+                prompt = self.generator.generate_prompt(variation_type, seed=42)
+                
+                self.assertIsInstance(prompt, str)
+                self.assertGreater(len(prompt), 10)  # Should be meaningful length
+                self.assertNotEqual(prompt.strip(), "")
     
     def test_generate_prompt_with_seed_consistency(self):
         """Test that same seed produces same prompt"""
@@ -92,9 +98,10 @@ class TestVariationPromptGenerator(unittest.TestCase):
 class TestVariationEngine(unittest.TestCase):
     """Test the variation engine"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        self.engine = VariationEngine()
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures (the engine is read-only, so share it)"""
+        cls.engine = VariationEngine()
     
     def test_initialization(self):
         """Test proper initialization"""
@@ -112,12 +119,14 @@ class TestVariationEngine(unittest.TestCase):
         # Valid types
         valid_types = ['random', 'object_rearrange', 'object_add']
         for vtype in valid_types:
-            self.assertTrue(self.engine.validate_variation_type(vtype))
+            with self.subTest(variation_type=vtype):
+                self.assertTrue(self.engine.validate_variation_type(vtype))
         
         # Invalid types
         invalid_types = ['invalid', '', 'wrong_type', None]
         for vtype in invalid_types:
-            self.assertFalse(self.engine.validate_variation_type(vtype))
+            with self.subTest(variation_type=vtype):
+                self.assertFalse(self.engine.validate_variation_type(vtype))
     
     def test_get_available_types(self):
         """Test getting available types"""
@@ -132,7 +141,7 @@ class TestVariationEngine(unittest.TestCase):
     def test_create_variation_prompt(self):
         """Test variation prompt creation"""
         # Create a simple test image
-        test_image = Image.new('RGB', (100, 100), 'blue')
+        test_image = Image.new('L', (100, 100), 128)
         
         prompt = self.engine.create_variation_prompt(
             base_image=test_image,
@@ -146,7 +155,7 @@ class TestVariationEngine(unittest.TestCase):
     
     def test_create_variation_prompt_with_different_ids(self):
         """Test that different variation IDs produce different prompts"""
-        test_image = Image.new('RGB', (100, 100), 'red')
+        test_image = Image.new('L', (100, 100), 128)
         seed = 100
         
         prompt1 = self.engine.create_variation_prompt(test_image, 1, 'random', seed)
@@ -161,6 +170,13 @@ class TestVariationEngine(unittest.TestCase):
 class TestImageVariationProcessor(unittest.TestCase):
     """Test the image variation processor (without API calls)"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Encode the test image once for the whole class"""
+        buffer = BytesIO()
+        Image.new('L', (200, 200), 128).save(buffer, 'PNG')
+        cls._png_bytes = buffer.getvalue()
+    
     def setUp(self):
         """Set up test fixtures"""
         # Use a dummy API key for testing
@@ -169,10 +185,9 @@ class TestImageVariationProcessor(unittest.TestCase):
         # Create a temporary directory for test files
         self.temp_dir = Path(tempfile.mkdtemp())
         
-        # Create a test image
+        # Write the pre-encoded test image
         self.test_image_path = self.temp_dir / "test_image.png"
-        test_image = Image.new('RGB', (200, 200), 'green')
-        test_image.save(self.test_image_path)
+        self.test_image_path.write_bytes(self._png_bytes)
     
     def tearDown(self):
         """Clean up test fixtures"""
@@ -235,7 +250,7 @@ class TestImageVariationProcessor(unittest.TestCase):
         
         # Text file (invalid image)
         text_file = self.temp_dir / "text.txt"
-        text_file.write_text("not an image")
+        text_file.write_bytes(b"not an image")
         self.assertFalse(self.processor.validate_image_file(text_file))
     
     def test_output_directory_creation(self):
@@ -263,17 +278,19 @@ class TestImageVariationProcessor(unittest.TestCase):
 class TestIntegration(unittest.TestCase):
     """Integration tests for the variation system"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create components shared by every test"""
+        cls.generator = VariationPromptGenerator()
+        cls.engine = VariationEngine()
+    
     def test_full_pipeline_without_api(self):
         """Test the full pipeline without making API calls"""
-        # Create components
-        generator = VariationPromptGenerator()
-        engine = VariationEngine()
-        
         # Test image
-        test_image = Image.new('RGB', (100, 100), 'yellow')
+        test_image = Image.new('L', (100, 100), 128)
         
         # Test prompt generation through engine
-        prompt = engine.create_variation_prompt(
+        prompt = self.engine.create_variation_prompt(
             base_image=test_image,
             variation_id=1,
             variation_type='style_change',
@@ -292,20 +309,19 @@ class TestIntegration(unittest.TestCase):
     
     def test_variation_type_coverage(self):
         """Test that all variation types produce valid prompts"""
-        generator = VariationPromptGenerator()
-        engine = VariationEngine()
-        test_image = Image.new('RGB', (50, 50), 'purple')
+        test_image = Image.new('L', (50, 50), 128)
         
-        for variation_type in engine.VARIATION_TYPES.keys():
-            prompt = engine.create_variation_prompt(
-                base_image=test_image,
-                variation_id=1,
-                variation_type=variation_type,
-                seed=123
-            )
-            
-            self.assertIsInstance(prompt, str, f"Failed for type: {variation_type}")
-            self.assertGreater(len(prompt), 5, f"Prompt too short for type: {variation_type}")
+        for variation_type in self.engine.VARIATION_TYPES.keys():
+            with self.subTest(variation_type=variation_type):
+                prompt = self.engine.create_variation_prompt(
+                    base_image=test_image,
+                    variation_id=1,
+                    variation_type=variation_type,
+                    seed=123
+                )
+                
+                self.assertIsInstance(prompt, str, f"Failed for type: {variation_type}")
+                self.assertGreater(len(prompt), 5, f"Prompt too short for type: {variation_type}")
 
 
 if __name__ == '__main__':
@@ -314,4 +330,4 @@ if __name__ == '__main__':
     tests_dir.mkdir(exist_ok=True)
     
     # Run tests
-    unittest.main(verbosity=2)
\ No newline at end of file
+    unittest.main(verbosity=1, buffer=True)
\ No newline at end of file
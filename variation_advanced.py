@@ -5,18 +5,22 @@ Advanced Image Variation Features
 """
 
 import os
+import re
 import sys
 import json
 import time
+import random
 import hashlib
 import logging
 import shutil
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple, Union
 from datetime import datetime
 import tempfile
 import numpy as np
-from PIL import Image, ImageStat, ImageFilter
+from PIL import Image, ImageFilter
 
 # 선택적 의존성들 (없으면 폴백 구현 사용)
 try:
@@ -25,23 +29,179 @@ try:
 except ImportError:
     HAS_OPENCV = False
 
-try:
-    from skimage.metrics import structural_similarity as ssim
-    HAS_SKIMAGE = True
-except ImportError:
-    HAS_SKIMAGE = False
-
 try:
     import imagehash
     HAS_IMAGEHASH = True
 except ImportError:
     HAS_IMAGEHASH = False
 
+try:
+    import blake3
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+
+def _cached_image_array(image: Image.Image, attr: str, build) -> Any:
+    """이미지 객체에 파생 배열(또는 통계값)을 한 번만 계산해 붙여 둠 (이미지는 생성 후 변경되지 않는다고 가정)"""
+    cached = getattr(image, attr, None)
+    if cached is None:
+        cached = build(image)
+        try:
+            setattr(image, attr, cached)
+        except AttributeError:
+            pass
+    return cached
+
+
+def _clear_image_caches(image: Image.Image) -> None:
+    """이미지를 제자리에서 변경했을 때 _cached_image_array로 붙여 둔 파생 값(_nb_*) 제거"""
+    for attr in [name for name in vars(image) if name.startswith('_nb_')]:
+        delattr(image, attr)
+
+
+def _histogram_array(image: Image.Image) -> np.ndarray:
+    """채널별 히스토그램을 float64 배열로 반환 (이미지별 캐시)"""
+    return _cached_image_array(
+        image, '_nb_histogram', lambda img: np.asarray(img.histogram(), dtype=np.float64)
+    )
+
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+def _histogram_moments(hist: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """256구간 히스토그램(마지막 축)에서 평균과 분산을 O(256)으로 계산"""
+    count = hist.sum(axis=-1)
+    mean = hist @ _LEVELS / count
+    var = hist @ (_LEVELS ** 2) / count - mean ** 2
+    return mean, np.maximum(var, 0.0)
+
+
+def _luma_stats(gray: np.ndarray) -> Tuple[float, float, np.ndarray]:
+    """그레이스케일 배열의 (평균, 표준편차, 히스토그램)을 bincount 한 번으로 계산"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    mean, var = _histogram_moments(hist)
+    return float(mean), float(np.sqrt(var)), hist
+
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    """캐시로 공유되는 배열을 읽기 전용으로 표시"""
+    array.flags.writeable = False
+    return array
+
+
+def _as_gray(image: Image.Image) -> np.ndarray:
+    """그레이스케일(L) 픽셀 배열 (이미지별 캐시, 읽기 전용)"""
+    return _cached_image_array(
+        image, '_nb_gray', lambda img: _readonly(np.array(img.convert('L')))
+    )
+
+
+def _edge_array(image: Image.Image) -> np.ndarray:
+    """FIND_EDGES 필터 결과의 그레이스케일 배열 (이미지별 캐시, 읽기 전용)"""
+    return _cached_image_array(
+        image, '_nb_edges',
+        lambda img: _readonly(np.array(img.filter(ImageFilter.FIND_EDGES).convert('L')))
+    )
+
+
+_EDGE_THRESHOLD = 128  # Sobel L1 크기 기준 (밝기 차 약 32 이상의 경계)
+
+
+def _sobel_edge_ratio(gray: np.ndarray, threshold: int = _EDGE_THRESHOLD) -> float:
+    """3x3 Sobel |gx|+|gy|가 threshold를 넘는 내부 픽셀 비율 (분리형 필터, int16 연산)"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    g = gray.astype(np.int16)
+    
+    # [1, 2, 1] 평활화 후 중심 차분 (값 범위 ±1020이므로 int16로 충분)
+    vertical = g[:-2] + 2 * g[1:-1] + g[2:]
+    gx = vertical[:, 2:] - vertical[:, :-2]
+    horizontal = g[:, :-2] + 2 * g[:, 1:-1] + g[:, 2:]
+    gy = horizontal[2:] - horizontal[:-2]
+    
+    np.abs(gx, out=gx)
+    gx += np.abs(gy)
+    return np.count_nonzero(gx > threshold) / gx.size
+
+
+def _gray_features(image: Image.Image) -> Tuple[float, float, float]:
+    """캐시된 그레이스케일 하나에서 (밝기 평균, 밝기 표준편차, Sobel 엣지 비율)을 함께 계산 (이미지별 캐시)"""
+    def build(img: Image.Image) -> Tuple[float, float, float]:
+        gray = _as_gray(img)
+        luma_mean, luma_std, _ = _luma_stats(gray)
+        return luma_mean, luma_std, _sobel_edge_ratio(gray)
+    
+    return _cached_image_array(image, '_nb_gray_features', build)
+
+
+_SSIM_SIZE = (256, 256)
+_SSIM_C1 = (0.01 * 255) ** 2 * 64
+_SSIM_C2 = (0.03 * 255) ** 2 * 64 * 63
+
+
+def _ssim_gray(image: Image.Image) -> np.ndarray:
+    """SSIM 비교용 고정 크기 그레이스케일 배열 (이미지별 캐시, 읽기 전용)"""
+    return _cached_image_array(
+        image, '_nb_ssim_gray',
+        lambda img: _readonly(np.array(img.convert('L').resize(_SSIM_SIZE, Image.Resampling.BILINEAR)))
+    )
+
+
+def _ssim_blocksum(a: np.ndarray, b: np.ndarray) -> float:
+    """4x4 블록 합 기반 SSIM 근사 (x264 tiny_ssim 방식, 8x8 창을 4픽셀 간격으로 이동)"""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    h4, w4 = a.shape[0] // 4, a.shape[1] // 4
+    
+    def block_sums(x: np.ndarray) -> np.ndarray:
+        return x[:h4 * 4, :w4 * 4].reshape(h4, 4, w4, 4).sum(axis=(1, 3))
+    
+    def window_sums(x: np.ndarray) -> np.ndarray:
+        # 인접한 2x2 블록을 합쳐 8x8 창 합계 생성
+        return x[:-1, :-1] + x[1:, :-1] + x[:-1, 1:] + x[1:, 1:]
+    
+    s1 = window_sums(block_sums(a))
+    s2 = window_sums(block_sums(b))
+    ss = window_sums(block_sums(a * a) + block_sums(b * b))
+    s12 = window_sums(block_sums(a * b))
+    
+    variance = ss * 64 - s1 * s1 - s2 * s2
+    covariance = s12 * 64 - s1 * s2
+    ssim_map = ((2 * s1 * s2 + _SSIM_C1) * (2 * covariance + _SSIM_C2)) / \
+               ((s1 * s1 + s2 * s2 + _SSIM_C1) * (variance + _SSIM_C2))
+    return float(ssim_map.mean())
+
 
 class VariationQualityAnalyzer:
     """변형 품질 분석 및 검증"""
     
-    def __init__(self):
+    # 종합 점수 가중치 (호출마다 dict를 만들지 않도록 고정 순서 배열로 보관)
+    _AESTHETIC_WEIGHTS = np.array([
+        0.25,  # 색상 분산
+        0.25,  # 대비
+        0.25,  # 밝기 균형
+        0.25,  # 선명도
+    ])
+    _OVERALL_WEIGHTS = np.array([
+        0.2,  # 원본과의 적절한 유사성
+        0.3,  # 다른 변형들과의 차별성
+        0.3,  # 미적 품질
+        0.2,  # 객체 완전성
+    ])
+    
+    def __init__(self, diversity_sample_size: int = 8, use_ssim: bool = False):
+        self.diversity_sample_size = diversity_sample_size  # 다양성 추정에 쓸 최대 비교 수
+        # 유사도 지표 선택: 기본은 히스토그램 코사인 유사도 (아래 유사도 기준값의 척도),
+        # True면 NumPy 블록 합 SSIM (외부 라이브러리 불필요, 점수 분포가 달라 기준값 조정 필요)
+        self.use_ssim = use_ssim
         self.quality_thresholds = {
             'similarity_min': 0.3,  # 원본과의 최소 유사도
             'similarity_max': 0.9,  # 원본과의 최대 유사도
@@ -52,7 +212,7 @@ class VariationQualityAnalyzer:
     
     def analyze_variation_quality(self, original_image: Image.Image, 
                                 variation_image: Image.Image, 
-                                other_variations: List[Image.Image] = None) -> Dict[str, float]:
+                                other_variations: Union[List[Image.Image], np.ndarray] = None) -> Dict[str, float]:
         """변형 품질 종합 분석"""
         metrics = {}
         
@@ -61,7 +221,7 @@ class VariationQualityAnalyzer:
             metrics['similarity'] = self.calculate_similarity(original_image, variation_image)
             
             # 2. 다양성 분석 (다른 변형들과의 차이)
-            if other_variations:
+            if other_variations is not None and len(other_variations) > 0:
                 metrics['diversity'] = self.calculate_diversity(variation_image, other_variations)
             else:
                 metrics['diversity'] = 1.0  # 첫 번째 변형은 최대 다양성
@@ -91,7 +251,7 @@ class VariationQualityAnalyzer:
     def calculate_similarity(self, img1: Image.Image, img2: Image.Image) -> float:
         """이미지 간 유사도 계산"""
         try:
-            if HAS_SKIMAGE and HAS_OPENCV:
+            if self.use_ssim:
                 return self._calculate_similarity_ssim(img1, img2)
             else:
                 return self._calculate_similarity_histogram(img1, img2)
@@ -100,42 +260,72 @@ class VariationQualityAnalyzer:
             return 0.5
     
     def _calculate_similarity_ssim(self, img1: Image.Image, img2: Image.Image) -> float:
-        """SSIM 기반 유사도 계산 (고급)"""
-        # 이미지를 그레이스케일로 변환
-        img1_gray = np.array(img1.convert('L'))
-        img2_gray = np.array(img2.convert('L'))
+        """SSIM 기반 유사도 계산 (use_ssim=True일 때)"""
+        # 고정 크기 그레이스케일로 축소해 크기 통일 및 연산량 고정 (이미지별 캐시)
+        img1_gray = _ssim_gray(img1)
+        img2_gray = _ssim_gray(img2)
         
-        # 크기 통일
-        if img1_gray.shape != img2_gray.shape:
-            img2_gray = cv2.resize(img2_gray, img1_gray.shape[::-1])
-        
-        # SSIM 계산
-        similarity_score = ssim(img1_gray, img2_gray)
+        # 블록 합 기반 SSIM 계산
+        similarity_score = _ssim_blocksum(img1_gray, img2_gray)
         return max(0.0, min(1.0, similarity_score))
     
     def _calculate_similarity_histogram(self, img1: Image.Image, img2: Image.Image) -> float:
-        """히스토그램 기반 유사도 계산 (폴백)"""
-        # RGB 채널별 히스토그램 생성
-        hist1 = img1.histogram()
-        hist2 = img2.histogram()
-        
-        # 코사인 유사도 계산
-        sum_sq1 = sum(x*x for x in hist1)
-        sum_sq2 = sum(x*x for x in hist2)
-        sum_prod = sum(x*y for x, y in zip(hist1, hist2))
+        """히스토그램 기반 유사도 계산 (기본)"""
+        # RGB 채널별 히스토그램 생성 (이미지별로 한 번만 계산)
+        hist1 = _histogram_array(img1)
+        hist2 = _histogram_array(img2)
         
-        if sum_sq1 * sum_sq2 == 0:
+        # 코사인 유사도 계산 (모드가 달라 길이가 다르면 공통 구간만 내적)
+        common = min(hist1.size, hist2.size)
+        norm_product = np.linalg.norm(hist1) * np.linalg.norm(hist2)
+        if norm_product == 0:
             return 0.0
         
-        similarity = sum_prod / (sum_sq1 * sum_sq2) ** 0.5
+        similarity = float(np.dot(hist1[:common], hist2[:common])) / norm_product
         return max(0.0, min(1.0, similarity))
     
-    def calculate_diversity(self, target_img: Image.Image, other_imgs: List[Image.Image]) -> float:
-        """변형들 간 다양성 계산"""
-        if not other_imgs:
+    def _calculate_similarity_histogram_stack(self, target_img: Image.Image,
+                                              image_stack: np.ndarray) -> np.ndarray:
+        """(N, H, W[, C]) uint8 배열 묶음과의 히스토그램 유사도 일괄 계산"""
+        count = image_stack.shape[0]
+        channels = image_stack.shape[3] if image_stack.ndim == 4 else 1
+        
+        # 이미지·채널별 오프셋을 더해 bincount 한 번으로 PIL histogram()과 같은 배치를 생성
+        pixels = image_stack.reshape(count, -1, channels).astype(np.int64)
+        offsets = np.arange(channels) * 256 + (np.arange(count) * 256 * channels)[:, None, None]
+        hists = np.bincount((pixels + offsets).ravel(), minlength=count * 256 * channels)
+        hists = hists.reshape(count, 256 * channels).astype(np.float64)
+        
+        target_hist = _histogram_array(target_img)
+        common = min(target_hist.size, hists.shape[1])
+        
+        norm_product = np.linalg.norm(target_hist) * np.linalg.norm(hists, axis=1)
+        sum_prod = hists[:, :common] @ target_hist[:common]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similarity = np.where(norm_product > 0, sum_prod / norm_product, 0.0)
+        return np.clip(similarity, 0.0, 1.0)
+    
+    def calculate_diversity(self, target_img: Image.Image,
+                            other_imgs: Union[List[Image.Image], np.ndarray]) -> float:
+        """변형들 간 다양성 계산 (이미지 목록 또는 (N, H, W, C) 배열 묶음)"""
+        if len(other_imgs) == 0:
             return 1.0
         
         try:
+            is_stack = isinstance(other_imgs, np.ndarray)
+            if is_stack and not self.use_ssim:
+                similarities = self._calculate_similarity_histogram_stack(target_img, other_imgs)
+                return float(np.mean(1.0 - similarities))
+            
+            # 이미지별 유사도 계산은 비싸므로 표본 평균으로 추정
+            if len(other_imgs) > self.diversity_sample_size:
+                picked = sorted(random.sample(range(len(other_imgs)), self.diversity_sample_size))
+                other_imgs = [other_imgs[index] for index in picked]
+            
+            if is_stack:
+                other_imgs = [Image.fromarray(arr) for arr in other_imgs]
+            
             # 각 이미지와의 차이 계산
             differences = []
             for other_img in other_imgs:
@@ -151,41 +341,31 @@ class VariationQualityAnalyzer:
     def analyze_aesthetic_quality(self, image: Image.Image) -> float:
         """미적 품질 분석"""
         try:
-            # 기본 이미지 통계
-            stat = ImageStat.Stat(image)
-            
-            metrics = {}
+            # 기본 이미지 통계 (채널별 히스토그램에서 분산 도출)
+            _, channel_var = _histogram_moments(_histogram_array(image).reshape(-1, 256))
+            luma_mean, luma_std, _ = _gray_features(image)
             
             # 1. 색상 분산 (다채로운 색상 선호)
-            if len(stat.var) >= 3:
-                color_variance = np.var(stat.var[:3])
-                metrics['color_variance'] = min(color_variance / 10000, 1.0)
+            if channel_var.size >= 3:
+                color_variance = np.var(channel_var[:3])
+                color_score = min(color_variance / 10000, 1.0)
             else:
-                metrics['color_variance'] = 0.5
+                color_score = 0.5
             
             # 2. 대비 분석
-            img_array = np.array(image.convert('L'))
-            contrast = np.std(img_array) / 255.0
-            metrics['contrast'] = min(contrast * 2, 1.0)
+            contrast = luma_std / 255.0
+            contrast_score = min(contrast * 2, 1.0)
             
             # 3. 밝기 균형
-            brightness = np.mean(img_array) / 255.0
-            brightness_balance = 1.0 - abs(brightness - 0.5) * 2
-            metrics['brightness_balance'] = max(0.0, brightness_balance)
+            brightness = luma_mean / 255.0
+            brightness_balance = max(0.0, 1.0 - abs(brightness - 0.5) * 2)
             
             # 4. 선명도 (간단한 방식)
             sharpness = self._calculate_sharpness_simple(image)
-            metrics['sharpness'] = sharpness
-            
-            # 종합 미적 점수
-            weights = {
-                'color_variance': 0.25,
-                'contrast': 0.25,
-                'brightness_balance': 0.25,
-                'sharpness': 0.25
-            }
             
-            aesthetic_score = sum(metrics[key] * weights[key] for key in weights)
+            # 종합 미적 점수 (_AESTHETIC_WEIGHTS 순서)
+            scores = np.array([color_score, contrast_score, brightness_balance, sharpness])
+            aesthetic_score = float(scores @ self._AESTHETIC_WEIGHTS)
             return max(0.0, min(1.0, aesthetic_score))
             
         except Exception as e:
@@ -195,11 +375,10 @@ class VariationQualityAnalyzer:
     def _calculate_sharpness_simple(self, image: Image.Image) -> float:
         """간단한 선명도 계산 (PIL 기반)"""
         try:
-            # 엣지 필터 적용
-            edges = image.filter(ImageFilter.FIND_EDGES)
+            # 엣지 필터 결과 (이미지별 캐시)
+            edge_array = _edge_array(image)
             
             # 엣지 픽셀의 분산 계산
-            edge_array = np.array(edges.convert('L'))
             sharpness = np.var(edge_array) / (255.0 ** 2)
             
             return min(sharpness * 10, 1.0)
@@ -220,17 +399,11 @@ class VariationQualityAnalyzer:
     
     def _verify_object_integrity_opencv(self, image: Image.Image) -> float:
         """OpenCV 기반 객체 완전성 검증"""
-        img_array = np.array(image.convert('L'))
-        
-        # Canny 엣지 검출
-        edges = cv2.Canny(img_array, 50, 150)
-        
-        # 연결된 컴포넌트 분석
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(edges)
+        # 엣지 연결 성분 면적 (이미지별 캐시)
+        areas = _cached_image_array(image, '_nb_edge_areas', self._edge_component_areas)
         
         # 객체 완전성 점수
-        if num_labels > 1:
-            areas = stats[1:, cv2.CC_STAT_AREA]  # 배경 제외
+        if areas.size > 0:
             total_area = image.size[0] * image.size[1]
             large_areas = areas[areas > total_area * 0.01]
             integrity = min(len(large_areas) / 10, 1.0)
@@ -239,16 +412,25 @@ class VariationQualityAnalyzer:
         
         return integrity
     
+    @staticmethod
+    def _edge_component_areas(image: Image.Image) -> np.ndarray:
+        """Canny 엣지의 연결 성분별 면적 (배경 제외)"""
+        img_array = _as_gray(image)
+        
+        # 밝기 중앙값 기준 자동 임계값으로 Canny 엣지 검출
+        median = float(np.median(img_array))
+        low = int(max(0, 0.66 * median))
+        high = int(min(255, 1.33 * median))
+        edges = cv2.Canny(img_array, low, high)
+        
+        # 면적만 필요하므로 통계/중심 배열 없이 라벨링 후 bincount
+        _, labels = cv2.connectedComponents(edges, connectivity=8)
+        return np.bincount(labels.ravel())[1:]
+    
     def _verify_object_integrity_simple(self, image: Image.Image) -> float:
         """단순한 객체 완전성 검증 (폴백)"""
-        # 엣지 필터로 근사적 분석
-        edges = image.filter(ImageFilter.FIND_EDGES)
-        edge_array = np.array(edges.convert('L'))
-        
-        # 엣지 픽셀 비율 계산
-        edge_pixels = np.sum(edge_array > 50)
-        total_pixels = edge_array.size
-        edge_ratio = edge_pixels / total_pixels
+        # 미적 품질 분석과 함께 계산된 Sobel 엣지 픽셀 비율
+        _, _, edge_ratio = _gray_features(image)
         
         # 적절한 엣지 비율을 객체 완전성으로 간주
         integrity = min(edge_ratio * 20, 1.0)  # 5% 엣지 = 1.0 점수
@@ -256,13 +438,6 @@ class VariationQualityAnalyzer:
     
     def calculate_overall_quality(self, metrics: Dict[str, float]) -> float:
         """전체 품질 점수 계산"""
-        weights = {
-            'similarity': 0.2,      # 원본과의 적절한 유사성
-            'diversity': 0.3,       # 다른 변형들과의 차별성
-            'aesthetic': 0.3,       # 미적 품질
-            'object_integrity': 0.2  # 객체 완전성
-        }
-        
         # 유사도는 적정 범위에 있을 때 높은 점수
         similarity_score = metrics.get('similarity', 0.5)
         if 0.3 <= similarity_score <= 0.9:
@@ -270,14 +445,15 @@ class VariationQualityAnalyzer:
         else:
             similarity_weighted = 0.1
         
-        weighted_metrics = {
-            'similarity': similarity_weighted,
-            'diversity': metrics.get('diversity', 0.5),
-            'aesthetic': metrics.get('aesthetic', 0.5),
-            'object_integrity': metrics.get('object_integrity', 0.5)
-        }
+        # _OVERALL_WEIGHTS 순서
+        weighted_metrics = np.array([
+            similarity_weighted,
+            metrics.get('diversity', 0.5),
+            metrics.get('aesthetic', 0.5),
+            metrics.get('object_integrity', 0.5)
+        ])
         
-        overall = sum(weighted_metrics[key] * weights[key] for key in weights)
+        overall = float(weighted_metrics @ self._OVERALL_WEIGHTS)
         return max(0.0, min(1.0, overall))
 
     def is_acceptable_quality(self, metrics: Dict[str, float]) -> bool:
@@ -297,25 +473,123 @@ class VariationQualityAnalyzer:
             return True  # 오류 시 관대하게 처리
 
 
+def _dct_matrix(size: int) -> np.ndarray:
+    """직교 DCT-II 변환 행렬 (D @ x @ D.T 가 2차원 DCT)"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_PHASH_DCT = _dct_matrix(32)
+
+
+if hasattr(int, 'bit_count'):  # Python 3.10+: POPCNT 한 번
+    def _hamming_distance(hash1: int, hash2: int) -> int:
+        """두 정수 해시의 해밍 거리"""
+        return (hash1 ^ hash2).bit_count()
+else:
+    def _hamming_distance(hash1: int, hash2: int) -> int:
+        """두 정수 해시의 해밍 거리"""
+        return bin(hash1 ^ hash2).count('1')
+
+
+_SWAR_M1 = np.uint64(0x5555555555555555)
+_SWAR_M2 = np.uint64(0x3333333333333333)
+_SWAR_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_SWAR_H01 = np.uint64(0x0101010101010101)
+
+
+def _popcount64_swar(x: np.ndarray) -> np.ndarray:
+    """uint64 배열 원소별 1비트 개수 (SWAR 비트 연산, NumPy 2.0 미만용)"""
+    x = x - ((x >> np.uint64(1)) & _SWAR_M1)
+    x = (x & _SWAR_M2) + ((x >> np.uint64(2)) & _SWAR_M2)
+    x = (x + (x >> np.uint64(4))) & _SWAR_M4
+    return (x * _SWAR_H01) >> np.uint64(56)
+
+
+# NumPy 2.0+의 bitwise_count는 POPCNT 명령으로 처리됨
+_popcount64 = getattr(np, 'bitwise_count', _popcount64_swar)
+
+
+class _BKTree:
+    """해밍 거리용 BK-트리 (반경 검색을 평균 O(log N)으로)"""
+    
+    def __init__(self):
+        self._root = None  # [해시, 값, {거리: 자식 노드}]
+    
+    def add(self, key: int, value: Any):
+        """해시와 연결된 값을 트리에 추가"""
+        node = [key, value, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = _hamming_distance(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+    
+    def find(self, key: int, radius: int) -> List[Tuple[int, Any]]:
+        """해밍 거리 radius 이내의 (거리, 값) 목록을 거리순으로 반환"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            distance = _hamming_distance(key, node_key)
+            if distance <= radius:
+                found.append((distance, value))
+            # 삼각 부등식: 자식 간선 거리가 [d - r, d + r] 범위인 가지만 탐색
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
 class DuplicationPreventer:
     """변형 중복 방지 시스템"""
     
-    def __init__(self, similarity_threshold: float = 0.95):
+    def __init__(self, similarity_threshold: float = 0.95, hash_distance_threshold: int = 2,
+                 candidate_distance: int = 8):
         self.similarity_threshold = similarity_threshold
+        self.hash_distance_threshold = hash_distance_threshold  # pHash 해밍 거리 허용치
+        self.candidate_distance = candidate_distance  # SSIM 정밀 검사 후보 반경
         self.generated_variations: List[Image.Image] = []
-        self.image_hashes = set()
+        self.image_hashes: List[int] = []
+        # 64비트 pHash는 uint64 배열 전수 비교(벡터화), 192비트 결합 해시는 BK-트리
+        self._flat_scan = not HAS_IMAGEHASH
+        self._hash_array = np.empty(64, dtype=np.uint64)
+        self._hash_tree = _BKTree()
         
-    def is_duplicate(self, new_image: Image.Image) -> bool:
-        """새 이미지가 기존 변형들과 중복인지 확인"""
+    def is_duplicate(self, new_image: Image.Image,
+                     image_hash: Optional[int] = None) -> bool:
+        """새 이미지가 기존 변형들과 중복인지 확인 (image_hash를 주면 해시 재계산 생략)"""
         try:
             # 1. 이미지 해시 기반 빠른 중복 검사
-            image_hash = self.calculate_image_hash(new_image)
-            if image_hash in self.image_hashes:
+            if image_hash is None:
+                image_hash = self.calculate_image_hash(new_image)
+            neighbors = self._hash_neighbors(
+                image_hash, max(self.hash_distance_threshold, self.candidate_distance)
+            )
+            if any(distance <= self.hash_distance_threshold for distance, _ in neighbors):
                 return True
             
-            # 2. 구조적 유사도 기반 정밀 검사
+            # 2. 구조적 유사도 기반 정밀 검사 (해시가 가까운 후보만)
+            candidates = [
+                self.generated_variations[index]
+                for distance, index in neighbors
+                if distance <= self.candidate_distance
+            ]
+            
             analyzer = VariationQualityAnalyzer()
-            for existing_image in self.generated_variations:
+            for existing_image in candidates:
                 similarity = analyzer.calculate_similarity(new_image, existing_image)
                 if similarity > self.similarity_threshold:
                     return True
@@ -325,54 +599,109 @@ class DuplicationPreventer:
             logging.warning(f"중복 검사 오류: {e}")
             return False  # 오류 시 관대하게 처리
     
-    def calculate_image_hash(self, image: Image.Image) -> str:
-        """이미지의 지각적 해시 계산"""
+    def _hash_neighbors(self, image_hash: int, radius: int) -> List[Tuple[int, int]]:
+        """해밍 거리 radius 이내로 등록된 변형의 (거리, 인덱스) 목록"""
+        if not self._flat_scan:
+            return self._hash_tree.find(image_hash, radius)
+        
+        hashes = self._hash_array[:len(self.image_hashes)]
+        distances = _popcount64(hashes ^ np.uint64(image_hash))
+        indices = np.flatnonzero(distances <= radius)
+        return list(zip(distances[indices].tolist(), indices.tolist()))
+    
+    def calculate_image_hash(self, image: Union[Image.Image, np.ndarray]) -> int:
+        """이미지의 지각적 해시 계산 (PIL 이미지 또는 NumPy 배열)"""
+        if isinstance(image, np.ndarray):
+            # 배열을 PIL 이미지로 감싸 같은 해시 경로 사용 (fromarray는 보통 픽셀 데이터를 복사함)
+            image = Image.fromarray(image)
+        
         if HAS_IMAGEHASH:
             return self._calculate_image_hash_advanced(image)
         else:
             return self._calculate_image_hash_simple(image)
     
-    def _calculate_image_hash_advanced(self, image: Image.Image) -> str:
-        """고급 이미지 해시 계산"""
-        # 여러 해시 알고리즘 조합 사용
+    def _calculate_image_hash_advanced(self, image: Image.Image) -> int:
+        """고급 이미지 해시 계산 (aHash·pHash·dHash를 192비트 정수 하나로 결합)"""
         hash_methods = [
             imagehash.average_hash,
             imagehash.phash,
             imagehash.dhash
         ]
         
-        hashes = []
-        for hash_method in hash_methods:
-            hash_value = hash_method(image)
-            hashes.append(str(hash_value))
-        
-        # 조합된 해시
-        combined_hash = "|".join(hashes)
-        return combined_hash
-    
-    def _calculate_image_hash_simple(self, image: Image.Image) -> str:
-        """단순한 이미지 해시 계산 (폴백)"""
-        # 이미지를 작은 크기로 리사이즈하고 해시 계산
-        small_image = image.resize((8, 8), Image.Resampling.LANCZOS)
-        gray_image = small_image.convert('L')
+        # 각 64비트 불리언 행렬을 비트로 압축해 이어 붙임 (문자열 변환 없음)
+        packed = b''.join(
+            np.packbits(hash_method(image).hash.ravel()).tobytes()
+            for hash_method in hash_methods
+        )
+        return int.from_bytes(packed, 'big')
+    
+    def _calculate_image_hash_simple(self, image: Image.Image) -> int:
+        """DCT 기반 64비트 지각적 해시 (pHash, 폴백)"""
+        # 32x32 그레이스케일로 축소 후 2차원 DCT
+        if HAS_OPENCV:
+            # 캐시된 그레이스케일에서 영역 평균 축소 (단일 채널만 처리)
+            small = cv2.resize(_as_gray(image), (32, 32),
+                               interpolation=cv2.INTER_AREA).astype(np.float64)
+        else:
+            small = np.asarray(image.convert('L').resize((32, 32), Image.Resampling.BILINEAR),
+                               dtype=np.float64)
+        # 반올림으로 부동소수점 잡음 제거 (단색 이미지의 AC 계수는 정확히 0)
+        dct = np.round(_PHASH_DCT @ small @ _PHASH_DCT.T, 6)
         
-        # 픽셀 값들을 해시로 변환
-        pixels = list(gray_image.getdata())
-        pixel_str = ''.join(str(p) for p in pixels)
-        return hashlib.md5(pixel_str.encode()).hexdigest()
+        # 저주파 8x8 계수를 중앙값과 비교해 64비트로 압축
+        low_freq = dct[:8, :8]
+        bits = (low_freq > np.median(low_freq)).ravel()
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    
+    def batch_hash(self, images: List[Image.Image]) -> List[int]:
+        """여러 이미지의 해시를 스레드 풀로 병렬 계산
+        (calculate_image_hash와 같은 해시 계열: imagehash가 있으면 192비트 결합 해시, 없으면 64비트 pHash)"""
+        return self._map_parallel(self.calculate_image_hash, images)
+    
+    def batch_add(self, images: List[Image.Image]) -> List[bool]:
+        """여러 변형을 한 번에 등록 (해시는 병렬 계산, 중복 검사·등록은 입력 순서대로)"""
+        image_hashes = self.batch_hash(images)
+        return [
+            self._register(image, image_hash)
+            for image, image_hash in zip(images, image_hashes)
+        ]
+    
+    @staticmethod
+    def _map_parallel(func, images: List[Image.Image]) -> List[Any]:
+        """리사이즈·DCT 구간은 GIL을 놓으므로 스레드 풀로 순서를 유지하며 병렬 적용"""
+        if len(images) <= 1:
+            return [func(image) for image in images]
+        with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1)) as executor:
+            return list(executor.map(func, images))
     
     def add_variation(self, image: Image.Image) -> bool:
         """새로운 변형을 중복 방지 시스템에 등록"""
-        if not self.is_duplicate(image):
+        return self._register(image, self.calculate_image_hash(image))
+    
+    def _register(self, image: Image.Image, image_hash: int) -> bool:
+        """미리 계산된 해시로 중복 검사 후 등록"""
+        if not self.is_duplicate(image, image_hash):
+            self._store_hash(image_hash)
             self.generated_variations.append(image.copy())
-            self.image_hashes.add(self.calculate_image_hash(image))
+            self.image_hashes.append(image_hash)
             return True
         return False
     
+    def _store_hash(self, image_hash: int):
+        """해시를 검색 구조에 추가 (uint64 배열은 가득 차면 두 배로 확장)"""
+        index = len(self.image_hashes)
+        if not self._flat_scan:
+            self._hash_tree.add(image_hash, index)
+            return
+        if index == len(self._hash_array):
+            self._hash_array = np.concatenate([self._hash_array, np.empty_like(self._hash_array)])
+        self._hash_array[index] = image_hash
+    
     def clear(self):
         """등록된 변형들 초기화"""
         self.generated_variations.clear()
         self.image_hashes.clear()
+        self._hash_tree = _BKTree()
 
 
 class MemoryOptimizer:
@@ -382,12 +711,22 @@ class MemoryOptimizer:
         self.max_memory_mb = max_memory_mb
         self.current_memory_usage = 0
         
-    def optimize_image_size(self, image: Image.Image, max_dimension: int = 2048) -> Image.Image:
-        """이미지 크기 최적화"""
+    def optimize_image_size(self, image: Image.Image, max_dimension: int = 2048,
+                            copy_on_resize: bool = True) -> Image.Image:
+        """이미지 크기 최적화 (기본은 원본을 보존하고 새 이미지 반환,
+        copy_on_resize=False면 호출자가 소유한 이미지를 제자리에서 축소)"""
         try:
             width, height = image.size
             
             if max(width, height) > max_dimension:
+                if not copy_on_resize:
+                    # 제자리 축소: 원본과 결과를 동시에 들고 있지 않아 최대 메모리가 절반
+                    # (JPEG는 draft로 디코딩 단계에서부터 축소)
+                    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+                    _clear_image_caches(image)  # 축소 전 크기로 계산된 캐시 무효화
+                    logging.info(f"이미지 크기 최적화: {width}x{height} → {image.size[0]}x{image.size[1]}")
+                    return image
+                
                 # 비례적 리사이즈
                 if width > height:
                     new_width = max_dimension
@@ -396,7 +735,13 @@ class MemoryOptimizer:
                     new_height = max_dimension
                     new_width = int((width * max_dimension) / height)
                 
-                optimized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                if HAS_OPENCV and image.mode in ('L', 'RGB', 'RGBA'):
+                    # 축소에는 영역 평균(INTER_AREA)이 LANCZOS보다 빠르고 앨리어싱도 적음
+                    resized = cv2.resize(np.asarray(image), (new_width, new_height),
+                                         interpolation=cv2.INTER_AREA)
+                    optimized = Image.fromarray(resized)
+                else:
+                    optimized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
                 logging.info(f"이미지 크기 최적화: {width}x{height} → {new_width}x{new_height}")
                 return optimized
             
@@ -405,6 +750,13 @@ class MemoryOptimizer:
             logging.warning(f"이미지 크기 최적화 오류: {e}")
             return image
     
+    def available_memory_mb(self) -> float:
+        """배치에 쓸 수 있는 메모리(MB): 설정 상한과 실제 여유 메모리(512MB 여유분 제외) 중 작은 값"""
+        if not HAS_PSUTIL:
+            return self.max_memory_mb
+        available_mb = psutil.virtual_memory().available / (1024 * 1024) - 512
+        return min(self.max_memory_mb, max(available_mb, 0))
+    
     def manage_batch_memory(self, batch_size: int, image_sizes: List[Tuple[int, int]]) -> int:
         """배치 처리 시 메모리 기반 최적 배치 크기 계산"""
         try:
@@ -412,14 +764,15 @@ class MemoryOptimizer:
                 return batch_size
             
             # 평균 이미지 메모리 사용량 추정
-            avg_pixels = sum(w * h for w, h in image_sizes) / len(image_sizes)
+            avg_pixels = np.prod(np.asarray(image_sizes, dtype=np.float64), axis=1).mean()
             estimated_mb_per_image = (avg_pixels * 3 * 4) / (1024 * 1024)  # RGB, float32
             
             # API 응답 이미지까지 고려한 메모리 사용량
             total_memory_per_batch = estimated_mb_per_image * batch_size * 2  # 원본 + 결과
+            memory_budget_mb = self.available_memory_mb()
             
-            if total_memory_per_batch > self.max_memory_mb:
-                optimal_batch_size = max(1, int(self.max_memory_mb / (estimated_mb_per_image * 2)))
+            if total_memory_per_batch > memory_budget_mb:
+                optimal_batch_size = max(1, int(memory_budget_mb / (estimated_mb_per_image * 2)))
                 logging.info(f"배치 크기 최적화: {batch_size} → {optimal_batch_size}")
                 return optimal_batch_size
             
@@ -438,6 +791,34 @@ class MemoryOptimizer:
             logging.warning(f"임시 파일 정리 오류: {e}")
 
 
+def _file_digest(path: Union[str, Path]) -> str:
+    """파일 내용 해시 (전체를 메모리에 읽지 않음: BLAKE3 mmap → hashlib.file_digest → 청크 읽기)"""
+    if HAS_BLAKE3:
+        return blake3.blake3().update_mmap(str(path)).hexdigest()
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _scan_size(path: Union[str, Path]) -> int:
+    """디렉토리 아래 파일 크기 합계 (os.scandir 재귀, 심볼릭 링크는 따라가지 않음)"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += _scan_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return total
+
+
 class VariationCache:
     """변형 생성 결과 캐싱"""
     
@@ -470,9 +851,8 @@ class VariationCache:
     def generate_cache_key(self, image_path: Path, prompt: str, variation_params: Dict) -> str:
         """캐시 키 생성"""
         try:
-            # 이미지 파일 해시
-            with open(image_path, 'rb') as f:
-                file_hash = hashlib.md5(f.read()).hexdigest()[:8]
+            # 이미지 파일 해시 (스트리밍)
+            file_hash = _file_digest(image_path)[:8]
             
             # 프롬프트 및 파라미터 해시
             param_str = f"{prompt}_{json.dumps(variation_params, sort_keys=True)}"
@@ -526,7 +906,8 @@ class VariationCache:
                 'prompt': prompt,
                 'params': params,
                 'created': datetime.now().isoformat(),
-                'last_used': datetime.now().isoformat()
+                'last_used': datetime.now().isoformat(),
+                'size_bytes': sum(os.path.getsize(path) for path in cached_paths)
             }
             
             self.save_cache_index()
@@ -536,18 +917,21 @@ class VariationCache:
         except Exception as e:
             logging.warning(f"결과 캐싱 오류: {e}")
     
+    def _entry_size(self, cache_key: str, entry: Dict) -> int:
+        """캐시 항목의 바이트 크기 (크기 기록이 없는 이전 인덱스 항목은 한 번만 스캔해 기록)"""
+        if 'size_bytes' not in entry:
+            entry['size_bytes'] = _scan_size(self.cache_dir / cache_key)
+        return entry['size_bytes']
+    
     def cleanup_old_cache(self):
         """오래된 캐시 정리"""
         try:
-            # 캐시 크기 확인
-            total_size = 0
-            for cache_dir in self.cache_dir.iterdir():
-                if cache_dir.is_dir():
-                    for f in cache_dir.rglob('*'):
-                        if f.is_file():
-                            total_size += f.stat().st_size
+            # 캐시 크기 확인 (인덱스에 기록된 항목별 크기 합산, 파일 시스템 재스캔 없음)
+            total_size = sum(
+                self._entry_size(cache_key, entry) for cache_key, entry in self.cache_index.items()
+            )
             
-            total_size_gb = total_size / (1024**3)
+            initial_size_gb = total_size_gb = total_size / (1024**3)
             
             if total_size_gb > self.max_cache_size_gb:
                 # 오래된 항목부터 제거
@@ -561,18 +945,14 @@ class VariationCache:
                         break
                         
                     # 캐시 디렉토리 제거
-                    cache_subdir = self.cache_dir / cache_key
-                    if cache_subdir.exists():
-                        dir_size = sum(f.stat().st_size for f in cache_subdir.rglob('*') if f.is_file())
-                        shutil.rmtree(cache_subdir, ignore_errors=True)
-                        total_size_gb -= dir_size / (1024**3)
+                    shutil.rmtree(self.cache_dir / cache_key, ignore_errors=True)
+                    total_size_gb -= entry['size_bytes'] / (1024**3)
                     
                     # 인덱스에서 제거
-                    if cache_key in self.cache_index:
-                        del self.cache_index[cache_key]
+                    del self.cache_index[cache_key]
                 
                 self.save_cache_index()
-                logging.info(f"캐시 정리 완료: {total_size_gb:.2f}GB → {total_size_gb:.2f}GB")
+                logging.info(f"캐시 정리 완료: {initial_size_gb:.2f}GB → {total_size_gb:.2f}GB")
         except Exception as e:
             logging.warning(f"캐시 정리 오류: {e}")
 
@@ -580,6 +960,13 @@ class VariationCache:
 class RetryManager:
     """지능적 재시도 시스템"""
     
+    # 재시도하지 않을 오류 메시지 패턴 (한 번의 정규식 검색으로 판별)
+    _NON_RETRYABLE_RE = re.compile(
+        r'authentication failed|invalid api key|quota exceeded'
+        r'|content policy violation|permission denied',
+        re.IGNORECASE
+    )
+    
     def __init__(self, max_attempts: int = 3, base_delay: float = 1.0):
         self.max_attempts = max_attempts
         self.base_delay = base_delay
@@ -609,23 +996,14 @@ class RetryManager:
     
     def is_non_retryable_error(self, error: Exception) -> bool:
         """재시도하지 않을 오류 판단"""
-        non_retryable_patterns = [
-            'authentication failed',
-            'invalid api key',
-            'quota exceeded',
-            'content policy violation',
-            'permission denied'
-        ]
-        
-        error_msg = str(error).lower()
-        return any(pattern in error_msg for pattern in non_retryable_patterns)
+        return bool(self._NON_RETRYABLE_RE.search(str(error)))
 
 
 class AdaptiveQualityManager:
     """점진적 품질 조정 시스템"""
     
     def __init__(self):
-        self.success_rate_history = []
+        self.success_rate_history = deque(maxlen=5)  # 최근 5회만 유지 (장기 실행 시 무한 증가 방지)
         self.current_quality_level = 'high'
         self.quality_settings = {
             'high': {
@@ -650,19 +1028,37 @@ class AdaptiveQualityManager:
         self.success_rate_history.append(success_rate)
         
         # 최근 5회 평균 계산
-        if len(self.success_rate_history) >= 5:
-            recent_avg = sum(self.success_rate_history[-5:]) / 5
-            
-            # 품질 수준 조정
-            if recent_avg < 0.5 and self.current_quality_level == 'high':
-                self.current_quality_level = 'medium'
-                logging.info("품질 수준을 중간으로 낮춤 (성능 개선을 위해)")
-            elif recent_avg < 0.3 and self.current_quality_level == 'medium':
-                self.current_quality_level = 'low'
-                logging.info("품질 수준을 낮음으로 조정 (안정성 확보를 위해)")
-            elif recent_avg > 0.8 and self.current_quality_level != 'high':
-                self.current_quality_level = 'high'
-                logging.info("성능이 좋아져 품질 수준을 높음으로 복원")
+        if len(self.success_rate_history) == self.success_rate_history.maxlen:
+            recent_avg = sum(self.success_rate_history) / len(self.success_rate_history)
+            self._apply_quality_transition(recent_avg)
+    
+    def adjust_quality_based_on_performance_batch(self, success_rates: np.ndarray):
+        """여러 성능 측정값을 한 번에 반영 (순차 호출과 동일한 상태 전이)"""
+        rates = np.asarray(success_rates, dtype=float).ravel()
+        if rates.size == 0:
+            return
+        
+        # 직전 4개 기록과 이어 붙여 새 값마다 끝나는 5개 구간 평균을 한 번에 계산
+        history = np.concatenate([np.asarray(list(self.success_rate_history)[-4:], dtype=float), rates])
+        self.success_rate_history.extend(rates.tolist())
+        if history.size < 5:
+            return
+        
+        recent_avgs = np.lib.stride_tricks.sliding_window_view(history, 5).sum(axis=1) / 5
+        for recent_avg in recent_avgs:
+            self._apply_quality_transition(recent_avg)
+    
+    def _apply_quality_transition(self, recent_avg: float):
+        """최근 평균 성공률에 따른 품질 수준 전이"""
+        if recent_avg < 0.5 and self.current_quality_level == 'high':
+            self.current_quality_level = 'medium'
+            logging.info("품질 수준을 중간으로 낮춤 (성능 개선을 위해)")
+        elif recent_avg < 0.3 and self.current_quality_level == 'medium':
+            self.current_quality_level = 'low'
+            logging.info("품질 수준을 낮음으로 조정 (안정성 확보를 위해)")
+        elif recent_avg > 0.8 and self.current_quality_level != 'high':
+            self.current_quality_level = 'high'
+            logging.info("성능이 좋아져 품질 수준을 높음으로 복원")
     
     def get_current_settings(self) -> Dict:
         """현재 품질 설정 반환"""
@@ -12,6 +12,294 @@ from pathlib import Path
 import json
 from datetime import datetime
 import shutil
+import signal
+import logging
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 선택적 의존성: orjson (C 확장 JSON 인코더, 없으면 표준 json 사용)
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+_REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _load_cli_module():
+    """batch_nanobanana_cli 모듈을 한 번만 임포트 (설치되지 않았으면 저장소 루트에서)
+    
+    CLI 모듈은 rich/tqdm 등이 없으면 임포트 중 sys.exit를 호출하므로 SystemExit도 잡아 None 반환"""
+    try:
+        try:
+            import batch_nanobanana_cli
+        except ImportError:
+            sys.path.insert(0, str(_REPO_ROOT))
+            import batch_nanobanana_cli
+    except (ImportError, SystemExit):
+        return None
+    return batch_nanobanana_cli
+
+
+def _print_style_result(done, total, result):
+    """끝난 스타일 하나의 결과를 한 번의 write로 출력"""
+    if result['status'] == 'success':
+        status = f"✅ 완료: {result['style']}"
+    else:
+        status = f"❌ 실패: {result['style']} - {result['error']}"
+    sys.stdout.write(
+        f"[{done}/{total}] {result['style']}\n"
+        f"💬 프롬프트: {result['prompt']}\n"
+        f"{status}\n"
+        f"{'-' * 30}\n"
+    )
+
+
+def _dump_json(data, path):
+    """JSON 파일 저장 (orjson이 있으면 UTF-8 바이트로 바로 기록)"""
+    if HAS_ORJSON:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _open_folder(path):
+    """파일 관리자로 폴더 열기 (실행만 하고 종료를 기다리지 않음)"""
+    if sys.platform == "win32":
+        os.startfile(path)
+        return
+    opener = "open" if sys.platform == "darwin" else "xdg-open"
+    subprocess.Popen([opener, str(path)], stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def _link_or_copy(src, dst):
+    """하드링크로 바이트 복사 없이 배치 (다른 파일 시스템 등 링크 불가 시 copy2로 폴백)"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link_or_copy_many(pairs, max_workers=8):
+    """(원본, 대상) 쌍을 한꺼번에 배치: 하드링크를 먼저 시도하고,
+    링크가 안 되는 파일만 스레드 풀에서 동시에 복사해 파일별 I/O 대기를 겹침"""
+    pending = []
+    for src, dst in pairs:
+        try:
+            os.link(src, dst)
+        except OSError:
+            pending.append((src, dst))
+    
+    if len(pending) == 1:
+        shutil.copy2(*pending[0])
+    elif pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            # 예외 전파를 위해 결과를 모두 소비
+            list(executor.map(lambda pair: shutil.copy2(*pair), pending))
+
+
+def _make_cli(cli_module, quiet=True):
+    """CLI 객체 생성 (메인 스레드에서 호출)
+    
+    생성자가 프로세스 전역 SIGINT/SIGTERM 핸들러를 설치하므로 생성 직후 원래 핸들러로 되돌려
+    테스터의 Ctrl+C(KeyboardInterrupt)와 SIGTERM 종료 동작을 유지하고, quiet이면 콘솔 출력은 숨김"""
+    saved = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        cli = cli_module.BatchNanoBananaCLI()
+    finally:
+        for sig, handler in saved.items():
+            signal.signal(sig, handler)
+    if quiet:
+        cli.console = cli_module.Console(quiet=True)
+    return cli
+
+
+def _resolve_api_key(cli_module):
+    """API 키를 메인 스레드에서 한 번만 확인 (환경변수 → 설정 파일 → 입력 프롬프트)
+    
+    작업 스레드마다 숨겨진 콘솔로 getpass를 띄우지 않도록 미리 구해 각 스타일에 전달"""
+    cli = _make_cli(cli_module, quiet=False)
+    cli.logger = logging.getLogger(cli_module.__name__)
+    return cli.get_api_key(argparse.Namespace(api_key=None, config=None, dry_run=False))
+
+
+@contextmanager
+def _silenced_cli_output(cli_module):
+    """프로세스 내 CLI 실행 동안 tqdm 진행 막대와 루트 로거 출력을 숨김
+    (예전 서브프로세스의 capture_output과 같은 효과)"""
+    # 루트 로거에 핸들러가 있으면 CLI의 logging.basicConfig(RichHandler)는 아무것도 하지 않음
+    root = logging.getLogger()
+    null_handler = logging.NullHandler()
+    root.addHandler(null_handler)
+    original_tqdm = cli_module.tqdm
+    cli_module.tqdm = functools.partial(original_tqdm, disable=True)
+    try:
+        yield
+    finally:
+        cli_module.tqdm = original_tqdm
+        root.removeHandler(null_handler)
+
+
+def _run_one_style(cli_module, cli, combo, original_dir, style_dir, concurrent, api_key):
+    """스타일 하나를 CLI 모듈로 프로세스 내에서 처리하고 결과 딕셔너리 반환 (스레드에서 호출됨)"""
+    # CLI 인자 구성 (명령줄 실행과 같은 파서 사용)
+    args = cli_module.create_parser().parse_args([
+        "--batch",
+        "--input-dir", str(original_dir),
+        "--output-dir", str(style_dir),
+        "--prompt", combo['prompt'],
+        "--concurrent", str(concurrent),
+        "--quiet"
+    ])
+    # 미리 확인한 키를 인자 객체에만 설정 (프로세스 내 호출이라 명령줄에 노출되지 않음)
+    args.api_key = api_key
+    
+    # 스타일 처리 시작 알림 (완료 출력까지 몇 분씩 걸릴 수 있음)
+    sys.stdout.write(f"▶ 처리 중: {combo['name']}\n")
+    
+    result = {"style": combo['name'], "prompt": combo['prompt']}
+    try:
+        cli.run(args)
+        exit_code = 0
+    except SystemExit as e:  # 배치 모드는 sys.exit로 결과를 알림
+        exit_code = e.code or 0
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+        return result
+    
+    if exit_code == 0:
+        result.update(status="success", output_dir=str(style_dir))
+    else:
+        result.update(status="failed", error=f"CLI 종료 코드 {exit_code}")
+    return result
+
+
+# 비교 HTML 조각 (CSS는 치환 없는 상수, 나머지는 format_map용 {name} 자리표시자)
+_HTML_HEAD_TMPL = """
+<!DOCTYPE html>
+<html lang="ko">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>스타일 비교 - {original_name}</title>
+"""
+
+_HTML_STYLE = """    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+            gap: 20px;
+            max-width: 1200px;
+            margin: 0 auto;
+        }
+        .card {
+            background: white;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            overflow: hidden;
+            transition: transform 0.2s;
+        }
+        .card:hover {
+            transform: translateY(-5px);
+        }
+        .card img {
+            width: 100%;
+            height: 250px;
+            object-fit: cover;
+        }
+        .card-content {
+            padding: 15px;
+        }
+        .style-name {
+            font-weight: bold;
+            font-size: 1.1em;
+            margin-bottom: 8px;
+            color: #333;
+        }
+        .prompt {
+            font-size: 0.9em;
+            color: #666;
+            line-height: 1.4;
+        }
+        .original {
+            border: 3px solid #4CAF50;
+        }
+        .failed {
+            background-color: #ffebee;
+            border: 1px solid #f44336;
+        }
+        .failed-text {
+            color: #f44336;
+            font-weight: bold;
+        }
+    </style>
+</head>
+"""
+
+_HTML_BODY_TMPL = """<body>
+    <div class="header">
+        <h1>🎨 스타일 비교 결과</h1>
+        <h2>원본: {original_name}</h2>
+        <p>생성 시간: {generated_at}</p>
+    </div>
+    
+    <div class="grid">
+"""
+
+_CARD_ORIGINAL_TMPL = """
+        <div class="card original">
+            <img src="original/{filename}" alt="원본">
+            <div class="card-content">
+                <div class="style-name">🖼️ 원본 이미지</div>
+                <div class="prompt">변환 전 원본 이미지입니다.</div>
+            </div>
+        </div>
+"""
+
+_CARD_SUCCESS_TMPL = """
+        <div class="card">
+            <img src="{path}" alt="{style}">
+            <div class="card-content">
+                <div class="style-name">🎨 {title}</div>
+                <div class="prompt">{prompt}</div>
+            </div>
+        </div>
+"""
+
+_CARD_FAIL_TMPL = """
+        <div class="card failed">
+            <div class="card-content">
+                <div class="style-name failed-text">❌ {title}</div>
+                <div class="prompt">{prompt}</div>
+                <div class="prompt" style="color: #f44336; margin-top: 10px;">
+                    처리 실패: {error}
+                </div>
+            </div>
+        </div>
+"""
+
+_HTML_FOOTER = """
+    </div>
+</body>
+</html>
+"""
 
 
 class CreatorMultiStyleTester:
@@ -41,6 +329,13 @@ class CreatorMultiStyleTester:
             "energetic": "역동적이고 활기차게",
             "melancholic": "감성적이고 우울한 분위기로"
         }
+        
+        # 스타일 + 무드 조합 프롬프트는 고정 데이터이므로 한 번만 생성
+        self.combined_prompts = {
+            (style, mood): f"{style_prompt}. {mood_modifier} 만들어주세요."
+            for style, style_prompt in self.base_styles.items()
+            for mood, mood_modifier in self.mood_modifiers.items()
+        }
     
     def generate_style_combinations(self, base_styles=None, moods=None, custom_prompts=None):
         """스타일 조합 생성"""
@@ -61,11 +356,9 @@ class CreatorMultiStyleTester:
                 if style in self.base_styles:
                     for mood in moods:
                         if mood in self.mood_modifiers:
-                            combined_name = f"{style}_{mood}"
-                            combined_prompt = f"{self.base_styles[style]}. {self.mood_modifiers[mood]} 만들어주세요."
                             combinations.append({
-                                "name": combined_name,
-                                "prompt": combined_prompt
+                                "name": f"{style}_{mood}",
+                                "prompt": self.combined_prompts[(style, mood)]
                             })
         
         # 커스텀 프롬프트
@@ -78,18 +371,18 @@ class CreatorMultiStyleTester:
         
         return combinations
     
-    def create_test_structure(self, base_dir, image_file, combinations):
-        """테스트용 디렉토리 구조 생성"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def create_test_structure(self, base_dir, image_file, combinations, run_ts=None):
+        """테스트용 디렉토리 구조 생성 (run_ts: 실행 시각, 없으면 현재 시각)"""
+        timestamp = (run_ts or datetime.now()).strftime("%Y%m%d_%H%M%S")
         test_dir = Path(base_dir) / f"multistyle_test_{timestamp}"
         
         # 메인 디렉토리 생성
         test_dir.mkdir(parents=True, exist_ok=True)
         
-        # 원본 이미지 복사
+        # 원본 이미지 배치 (읽기 전용으로만 쓰이므로 하드링크)
         original_dir = test_dir / "original"
         original_dir.mkdir(exist_ok=True)
-        shutil.copy2(image_file, original_dir / Path(image_file).name)
+        _link_or_copy(image_file, original_dir / Path(image_file).name)
         
         # 각 스타일별 디렉토리 생성
         style_dirs = {}
@@ -110,19 +403,22 @@ class CreatorMultiStyleTester:
             "directories": {name: str(path) for name, path in style_dirs.items()}
         }
         
-        with open(test_dir / "test_config.json", "w", encoding="utf-8") as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        _dump_json(config, test_dir / "test_config.json")
         
         return test_dir, style_dirs, original_dir
     
-    def run_style_test(self, image_file, combinations, output_dir=None, concurrent=1):
-        """멀티 스타일 테스트 실행"""
+    def run_style_test(self, image_file, combinations, output_dir=None, concurrent=1,
+                       style_concurrent=1):
+        """멀티 스타일 테스트 실행 (style_concurrent개 스타일을 동시에 처리)"""
         if output_dir is None:
             output_dir = Path.cwd() / "multistyle_results"
         
+        # 실행 시각은 한 번만 구해 디렉토리 이름과 HTML에 함께 사용
+        run_ts = datetime.now()
+        
         # 테스트 구조 생성
         test_dir, style_dirs, original_dir = self.create_test_structure(
-            output_dir, image_file, combinations
+            output_dir, image_file, combinations, run_ts
         )
         
         print(f"🎨 멀티 스타일 테스트 시작")
@@ -131,46 +427,55 @@ class CreatorMultiStyleTester:
         print(f"🎯 테스트할 스타일: {len(combinations)}개")
         print("=" * 50)
         
-        results = []
+        # 스타일별 CLI 호출은 서로 독립적인 I/O 대기이므로 병렬 처리
+        # (결과 순서는 조합 순서 유지, 진행 상황은 끝나는 순서대로 출력)
+        results = [None] * len(combinations)
         
-        for i, combo in enumerate(combinations, 1):
-            print(f"[{i}/{len(combinations)}] 처리 중: {combo['name']}")
-            print(f"💬 프롬프트: {combo['prompt']}")
-            
-            # CLI 명령어 구성
-            cmd = [
-                sys.executable, "batch_nanobanana_cli.py",
-                "--input-dir", str(original_dir),
-                "--output-dir", str(style_dirs[combo['name']]),
-                "--prompt", combo['prompt'],
-                "--concurrent", str(concurrent),
-                "--quiet"
-            ]
-            
-            try:
-                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-                print(f"✅ 완료: {combo['name']}")
-                results.append({
-                    "style": combo['name'],
-                    "prompt": combo['prompt'],
-                    "status": "success",
-                    "output_dir": str(style_dirs[combo['name']])
-                })
-            except subprocess.CalledProcessError as e:
-                print(f"❌ 실패: {combo['name']} - {e}")
-                results.append({
+        # 인터프리터를 스타일마다 새로 띄우지 않고 CLI 모듈을 한 번만 임포트해 직접 호출
+        # (CLI 객체는 메인 스레드에서 생성, 진행 막대·로그·콘솔 출력은 숨김)
+        cli_module = _load_cli_module()
+        if cli_module is None:
+            # CLI를 불러올 수 없으면 (예전 서브프로세스 실행처럼) 스타일마다 실패로 기록
+            for index, combo in enumerate(combinations):
+                results[index] = {
                     "style": combo['name'],
                     "prompt": combo['prompt'],
                     "status": "failed",
-                    "error": str(e)
-                })
+                    "error": "batch_nanobanana_cli를 불러올 수 없습니다 (필수 패키지 확인)"
+                }
+                _print_style_result(index + 1, len(combinations), results[index])
+        else:
+            api_key = _resolve_api_key(cli_module)
+            clis = []
             
-            print("-" * 30)
+            with _silenced_cli_output(cli_module), \
+                    ThreadPoolExecutor(max_workers=max(1, style_concurrent)) as executor:
+                futures = {}
+                for index, combo in enumerate(combinations):
+                    cli = _make_cli(cli_module)
+                    clis.append(cli)
+                    future = executor.submit(
+                        _run_one_style, cli_module, cli, combo, original_dir,
+                        style_dirs[combo['name']], concurrent, api_key
+                    )
+                    futures[future] = index
+                
+                try:
+                    for done, future in enumerate(as_completed(futures), 1):
+                        result = future.result()
+                        results[futures[future]] = result
+                        _print_style_result(done, len(combinations), result)
+                except KeyboardInterrupt:
+                    # 대기 중인 스타일은 취소하고, 실행 중인 스타일은 현재 이미지까지만 처리하게 함
+                    # (executor 종료 시 남은 작업 전체를 기다리지 않도록)
+                    for future in futures:
+                        future.cancel()
+                    for cli in clis:
+                        cli.is_processing = False
+                    raise
         
         # 결과 저장
-        results_file = test_dir / "results.json"
-        with open(results_file, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        _dump_json(results, test_dir / "results.json")
         
         # 성공한 결과들을 비교 폴더에 복사
         self.create_comparison_grid(test_dir, results)
@@ -180,164 +485,89 @@ class CreatorMultiStyleTester:
         print(f"📁 결과 위치: {test_dir}")
         
         # HTML 비교 페이지 생성
-        self.create_comparison_html(test_dir, results, Path(image_file).name)
+        self.create_comparison_html(test_dir, results, Path(image_file).name, run_ts)
         
         return test_dir, results
     
+    @staticmethod
+    def _generated_files(result):
+        """결과 폴더의 생성 파일 경로 목록 (os.scandir 한 번 후 결과 딕셔너리에 캐시)"""
+        if '_generated' not in result:
+            with os.scandir(result['output_dir']) as entries:
+                result['_generated'] = [
+                    Path(entry.path) for entry in entries
+                    if '_generated.' in entry.name and entry.is_file()
+                ]
+        return result['_generated']
+    
     def create_comparison_grid(self, test_dir, results):
         """결과 비교를 위한 그리드 생성"""
         comparison_dir = test_dir / "comparison"
         
-        # 성공한 결과들 복사
-        for result in results:
-            if result['status'] == 'success':
-                source_dir = Path(result['output_dir'])
-                generated_files = list(source_dir.glob("*_generated.*"))
-                
-                for file in generated_files:
-                    new_name = f"{result['style']}_{file.name}"
-                    shutil.copy2(file, comparison_dir / new_name)
-    
-    def create_comparison_html(self, test_dir, results, original_name):
-        """결과 비교를 위한 HTML 페이지 생성"""
-        html_content = f"""
-<!DOCTYPE html>
-<html lang="ko">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>스타일 비교 - {original_name}</title>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        .header {{
-            text-align: center;
-            margin-bottom: 30px;
-        }}
-        .grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            max-width: 1200px;
-            margin: 0 auto;
-        }}
-        .card {{
-            background: white;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            overflow: hidden;
-            transition: transform 0.2s;
-        }}
-        .card:hover {{
-            transform: translateY(-5px);
-        }}
-        .card img {{
-            width: 100%;
-            height: 250px;
-            object-fit: cover;
-        }}
-        .card-content {{
-            padding: 15px;
-        }}
-        .style-name {{
-            font-weight: bold;
-            font-size: 1.1em;
-            margin-bottom: 8px;
-            color: #333;
-        }}
-        .prompt {{
-            font-size: 0.9em;
-            color: #666;
-            line-height: 1.4;
-        }}
-        .original {{
-            border: 3px solid #4CAF50;
-        }}
-        .failed {{
-            background-color: #ffebee;
-            border: 1px solid #f44336;
-        }}
-        .failed-text {{
-            color: #f44336;
-            font-weight: bold;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>🎨 스타일 비교 결과</h1>
-        <h2>원본: {original_name}</h2>
-        <p>생성 시간: {datetime.now().strftime("%Y년 %m월 %d일 %H:%M:%S")}</p>
-    </div>
+        # 성공한 결과들 배치 (생성 결과는 수정되지 않으므로 하드링크)
+        _link_or_copy_many(
+            (file, comparison_dir / f"{result['style']}_{file.name}")
+            for result in results if result['status'] == 'success'
+            for file in self._generated_files(result)
+        )
     
-    <div class="grid">
-"""
+    def create_comparison_html(self, test_dir, results, original_name, run_ts=None):
+        """결과 비교를 위한 HTML 페이지 생성 (run_ts: 실행 시각, 없으면 현재 시각)"""
+        # 조각을 모아 마지막에 한 번만 이어 붙임 (문자열 += 반복 복사 방지)
+        header = {
+            'original_name': original_name,
+            'generated_at': (run_ts or datetime.now()).strftime("%Y년 %m월 %d일 %H:%M:%S"),
+        }
+        parts = [
+            _HTML_HEAD_TMPL.format_map(header),
+            _HTML_STYLE,
+            _HTML_BODY_TMPL.format_map(header),
+        ]
         
-        # 원본 이미지
-        original_dir = test_dir / "original"
-        original_files = list(original_dir.glob("*"))
-        if original_files:
-            original_file = original_files[0]
-            html_content += f"""
-        <div class="card original">
-            <img src="original/{original_file.name}" alt="원본">
-            <div class="card-content">
-                <div class="style-name">🖼️ 원본 이미지</div>
-                <div class="prompt">변환 전 원본 이미지입니다.</div>
-            </div>
-        </div>
-"""
+        # 원본 이미지 (create_test_structure가 original/에 원래 파일 이름 그대로 배치함,
+        # 폴더를 다시 스캔하지 않고 생성 파일이 섞여 있어도 원본을 정확히 지정)
+        if (test_dir / "original" / original_name).is_file():
+            parts.append(_CARD_ORIGINAL_TMPL.format_map({'filename': original_name}))
         
         # 각 스타일 결과
         for result in results:
+            card = {
+                'style': result['style'],
+                'title': result['style'].replace('_', ' ').title(),
+                'prompt': result['prompt'],
+            }
             if result['status'] == 'success':
-                # 생성된 파일 찾기
-                style_dir = Path(result['output_dir'])
-                generated_files = list(style_dir.glob("*_generated.*"))
+                # 생성된 파일 찾기 (비교 그리드에서 이미 스캔한 목록 재사용)
+                generated_files = self._generated_files(result)
                 
                 if generated_files:
-                    generated_file = generated_files[0]
-                    relative_path = f"{result['style']}/{generated_file.name}"
-                    html_content += f"""
-        <div class="card">
-            <img src="{relative_path}" alt="{result['style']}">
-            <div class="card-content">
-                <div class="style-name">🎨 {result['style'].replace('_', ' ').title()}</div>
-                <div class="prompt">{result['prompt']}</div>
-            </div>
-        </div>
-"""
+                    card['path'] = f"{result['style']}/{generated_files[0].name}"
+                    parts.append(_CARD_SUCCESS_TMPL.format_map(card))
             else:
-                html_content += f"""
-        <div class="card failed">
-            <div class="card-content">
-                <div class="style-name failed-text">❌ {result['style'].replace('_', ' ').title()}</div>
-                <div class="prompt">{result['prompt']}</div>
-                <div class="prompt" style="color: #f44336; margin-top: 10px;">
-                    처리 실패: {result.get('error', '알 수 없는 오류')}
-                </div>
-            </div>
-        </div>
-"""
+                card['error'] = result.get('error', '알 수 없는 오류')
+                parts.append(_CARD_FAIL_TMPL.format_map(card))
         
-        html_content += """
-    </div>
-</body>
-</html>
-"""
+        parts.append(_HTML_FOOTER)
         
         # HTML 파일 저장
         html_file = test_dir / "comparison.html"
         with open(html_file, "w", encoding="utf-8") as f:
-            f.write(html_content)
+            f.writelines(parts)
         
         print(f"📊 비교 페이지 생성: {html_file}")
 
 
+# 미리 정의된 스타일 세트: 프리셋 이름 -> (기본 스타일들, 무드들)
+_PRESETS = {
+    "basic": (("artistic", "vintage", "cinematic"), None),
+    "artistic": (("watercolor", "oil_painting", "sketch", "pop_art"), None),
+    "moody": (("cinematic", "dreamy"), ("dramatic", "peaceful", "melancholic")),
+    # 기본 스타일 중 처음 5개
+    "all": (("artistic", "cinematic", "dreamy", "vintage", "futuristic"),
+            ("bright", "dark", "warm")),
+}
+
+
 def main():
     """메인 함수"""
     parser = argparse.ArgumentParser(description="크리에이터 멀티 스타일 테스터")
@@ -347,9 +577,11 @@ def main():
     parser.add_argument("--custom", nargs="+", help="커스텀 프롬프트들")
     parser.add_argument("--output", "-o", help="출력 디렉토리")
     parser.add_argument("--concurrent", "-c", type=int, default=1, help="동시 처리 수")
+    parser.add_argument("--style-concurrent", type=int, default=1,
+                        help="동시에 테스트할 스타일 수 (API 동시 요청 한도 고려)")
     parser.add_argument("--list-styles", action="store_true", help="사용 가능한 스타일 목록 표시")
     parser.add_argument("--list-moods", action="store_true", help="사용 가능한 무드 목록 표시")
-    parser.add_argument("--preset", choices=["basic", "artistic", "moody", "all"], 
+    parser.add_argument("--preset", choices=list(_PRESETS), 
                        help="미리 정의된 스타일 세트")
     
     args = parser.parse_args()
@@ -359,14 +591,14 @@ def main():
     # 목록 표시
     if args.list_styles:
         print("🎨 사용 가능한 기본 스타일:")
-        for style, desc in tester.base_styles.items():
-            print(f"  {style}: {desc}")
+        sys.stdout.write("".join(f"  {style}: {desc}\n"
+                                 for style, desc in tester.base_styles.items()))
         return 0
     
     if args.list_moods:
         print("🌈 사용 가능한 무드:")
-        for mood, desc in tester.mood_modifiers.items():
-            print(f"  {mood}: {desc}")
+        sys.stdout.write("".join(f"  {mood}: {desc}\n"
+                                 for mood, desc in tester.mood_modifiers.items()))
         return 0
     
     # 이미지 파일 확인
@@ -376,28 +608,7 @@ def main():
     
     # 프리셋 설정
     if args.preset:
-        presets = {
-            "basic": {
-                "styles": ["artistic", "vintage", "cinematic"],
-                "moods": None
-            },
-            "artistic": {
-                "styles": ["watercolor", "oil_painting", "sketch", "pop_art"],
-                "moods": None
-            },
-            "moody": {
-                "styles": ["cinematic", "dreamy"],
-                "moods": ["dramatic", "peaceful", "melancholic"]
-            },
-            "all": {
-                "styles": list(tester.base_styles.keys())[:5],  # 처음 5개만
-                "moods": ["bright", "dark", "warm"]
-            }
-        }
-        
-        preset_config = presets[args.preset]
-        styles = preset_config["styles"]
-        moods = preset_config["moods"]
+        styles, moods = _PRESETS[args.preset]
     else:
         styles = args.styles
         moods = args.moods
@@ -416,9 +627,8 @@ def main():
         return 1
     
     print(f"🎯 생성된 스타일 조합 ({len(combinations)}개):")
-    for combo in combinations:
-        print(f"  - {combo['name']}")
-    print()
+    # 목록은 한 번에 이어 붙여 한 번만 출력 (줄마다 write 호출 방지)
+    sys.stdout.write("".join(f"  - {combo['name']}\n" for combo in combinations) + "\n")
     
     # 확인
     try:
@@ -436,16 +646,12 @@ def main():
             image_file=args.image,
             combinations=combinations,
             output_dir=args.output,
-            concurrent=args.concurrent
+            concurrent=args.concurrent,
+            style_concurrent=args.style_concurrent
         )
         
         # 결과 폴더 열기 (시스템에 따라)
-        if sys.platform == "win32":
-            os.startfile(test_dir)
-        elif sys.platform == "darwin":
-            subprocess.run(["open", test_dir])
-        else:
-            subprocess.run(["xdg-open", test_dir])
+        _open_folder(test_dir)
         
         return 0
         
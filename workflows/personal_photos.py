@@ -6,11 +6,59 @@ GUI와 CLI 사이의 브릿지 역할을 하는 간단한 도구
 
 import os
 import sys
+import queue
+import shutil
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import argparse
+from itertools import islice
+
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff'})
+
+
+# 스타일별 프롬프트 (GUI 없이도 CLI 인자 검증에 쓰도록 모듈 수준에 둠)
+STYLES = {
+    "artistic": "이 사진을 예술적이고 아름다운 작품으로 변환해주세요",
+    "vintage": "이 사진을 따뜻한 빈티지 스타일로 변환해주세요",
+    "dramatic": "이 사진을 드라마틱하고 영화 같은 분위기로 변환해주세요",
+    "bright": "이 사진을 밝고 생동감 있게 변환해주세요",
+    "portrait": "이 인물 사진을 전문적인 포트레이트로 변환해주세요",
+    "landscape": "이 풍경을 숨막히도록 아름다운 장면으로 변환해주세요",
+    "custom": ""  # 사용자 입력
+}
+
+
+def _iter_image_entries(folder):
+    """폴더의 이미지 파일 DirEntry 순회 (os.scandir: 항목별 Path 생성·추가 stat 없음)"""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if (entry.is_file(follow_symlinks=False)
+                    and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS):
+                yield entry
+
+
+def _open_folder(path):
+    """파일 관리자로 폴더 열기 (실행만 하고 종료를 기다리지 않음)"""
+    if sys.platform == "win32":
+        os.startfile(path)
+        return
+    opener = "open" if sys.platform == "darwin" else "xdg-open"
+    subprocess.Popen([opener, str(path)], stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def _link_or_copy(src, dst):
+    """하드링크로 배치 (링크 불가 시 copyfile: 메타데이터 불필요, 커널 고속 복사 경로 사용)"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 
 class PersonalPhotoProcessor:
@@ -27,15 +75,7 @@ class PersonalPhotoProcessor:
         self.style_var = tk.StringVar(value="artistic")
         
         # 스타일 옵션
-        self.styles = {
-            "artistic": "이 사진을 예술적이고 아름다운 작품으로 변환해주세요",
-            "vintage": "이 사진을 따뜻한 빈티지 스타일로 변환해주세요",
-            "dramatic": "이 사진을 드라마틱하고 영화 같은 분위기로 변환해주세요",
-            "bright": "이 사진을 밝고 생동감 있게 변환해주세요",
-            "portrait": "이 인물 사진을 전문적인 포트레이트로 변환해주세요",
-            "landscape": "이 풍경을 숨막히도록 아름다운 장면으로 변환해주세요",
-            "custom": ""  # 사용자 입력
-        }
+        self.styles = STYLES
         
         self.custom_prompt = tk.StringVar()
         
@@ -153,8 +193,9 @@ class PersonalPhotoProcessor:
         
         ttk.Button(button_frame, text="🧪 테스트 실행", 
                   command=self.test_run).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="🚀 처리 시작", 
-                  command=self.start_processing).pack(side=tk.LEFT, padx=5)
+        self.start_button = ttk.Button(button_frame, text="🚀 처리 시작", 
+                                       command=self.start_processing)
+        self.start_button.pack(side=tk.LEFT, padx=5)
         
         # 상태 표시
         self.status_label = ttk.Label(main_frame, text="준비됨")
@@ -225,18 +266,11 @@ class PersonalPhotoProcessor:
         style = self.style_var.get()
         if style == "custom":
             return self.custom_prompt.get().strip()
-        else:
-            return self.styles[style]
+        return STYLES[style]
     
     def count_images(self, folder):
         """폴더의 이미지 개수 세기"""
-        extensions = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff'}
-        count = 0
-        folder_path = Path(folder)
-        for file_path in folder_path.iterdir():
-            if file_path.suffix.lower() in extensions:
-                count += 1
-        return count
+        return sum(1 for _ in _iter_image_entries(folder))
     
     def test_run(self):
         """테스트 실행 (dry-run)"""
@@ -292,50 +326,67 @@ class PersonalPhotoProcessor:
             "--verbose"
         ]
         
-        # 미리보기 모드면 dry-run (실제로는 첫 3장만 처리하는 로직이 필요하지만 여기서는 단순화)
-        if self.preview_mode.get():
-            # 임시 폴더 만들어서 첫 3장만 복사하고 처리
-            import shutil
-            import tempfile
-            
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # 첫 3장 복사
-                extensions = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff'}
-                copied = 0
-                for file_path in Path(self.input_folder.get()).iterdir():
-                    if file_path.suffix.lower() in extensions and copied < 3:
-                        shutil.copy2(file_path, temp_dir)
-                        copied += 1
-                
-                # 임시 폴더로 처리
-                cmd[2] = temp_dir  # input-dir 변경
+        # 처리 중에는 재실행 방지, CLI는 작업 스레드에서 실행 (Tk 메인 루프는 계속 응답)
+        self.start_button.state(['disabled'])
+        self.status_label.config(text="처리 중... (CLI 창을 확인하세요)")
         
+        self._result_queue = queue.Queue()
+        preview_input = self.input_folder.get() if self.preview_mode.get() else None
+        threading.Thread(target=self._process_worker, args=(cmd, preview_input),
+                         daemon=True).start()
+        self.root.after(100, self._poll_processing)
+    
+    def _process_worker(self, cmd, preview_input):
+        """작업 스레드: CLI 실행 후 결과(None 또는 예외)를 큐에 넣음 (Tk 호출 금지)"""
         try:
-            self.status_label.config(text="처리 중... (CLI 창을 확인하세요)")
-            self.root.update()
-            
-            # CLI 실행
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            
-            self.status_label.config(text="✅ 처리 완료!")
-            
-            messagebox.showinfo("완료", "이미지 처리가 완료되었습니다!")
-            
-            # 결과 폴더 열기
-            if self.open_result.get():
-                if sys.platform == "win32":
-                    os.startfile(self.output_folder.get())
-                elif sys.platform == "darwin":
-                    subprocess.run(["open", self.output_folder.get()])
-                else:
-                    subprocess.run(["xdg-open", self.output_folder.get()])
-            
-        except subprocess.CalledProcessError as e:
-            self.status_label.config(text="❌ 처리 실패")
-            messagebox.showerror("오류", f"처리 중 오류가 발생했습니다:\n{e}")
+            if preview_input:
+                # 임시 폴더 만들어서 첫 3장만 복사하고 처리 (실행이 끝날 때까지 유지)
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    for entry in islice(_iter_image_entries(preview_input), 3):
+                        _link_or_copy(entry.path, os.path.join(temp_dir, entry.name))
+                    cmd[cmd.index("--input-dir") + 1] = temp_dir
+                    self._run_cli(cmd)
+            else:
+                self._run_cli(cmd)
+            self._result_queue.put(None)
         except Exception as e:
+            self._result_queue.put(e)
+    
+    @staticmethod
+    def _run_cli(cmd):
+        """CLI 실행: 진행 로그(stdout)는 버리고 실패 메시지용 stderr만 받음
+        (출력 전체를 메모리에 쌓지 않음)"""
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.PIPE, text=True)
+    
+    def _poll_processing(self):
+        """Tk 스레드: 작업 완료 여부를 주기적으로 확인하고 결과 표시"""
+        try:
+            error = self._result_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self._poll_processing)
+            return
+        
+        self.start_button.state(['!disabled'])
+        
+        if isinstance(error, subprocess.CalledProcessError):
+            self.status_label.config(text="❌ 처리 실패")
+            detail = (error.stderr or "").strip()[-500:]
+            messagebox.showerror("오류", f"처리 중 오류가 발생했습니다:\n{error}"
+                                 + (f"\n\n{detail}" if detail else ""))
+            return
+        if error is not None:
             self.status_label.config(text="❌ 오류 발생")
-            messagebox.showerror("오류", f"예상치 못한 오류가 발생했습니다:\n{e}")
+            messagebox.showerror("오류", f"예상치 못한 오류가 발생했습니다:\n{error}")
+            return
+        
+        self.status_label.config(text="✅ 처리 완료!")
+        
+        messagebox.showinfo("완료", "이미지 처리가 완료되었습니다!")
+        
+        # 결과 폴더 열기
+        if self.open_result.get():
+            _open_folder(self.output_folder.get())
     
     def run(self):
         """GUI 실행"""
@@ -348,7 +399,7 @@ def main():
     parser.add_argument("--cli", action="store_true", help="CLI 모드로 실행")
     parser.add_argument("--input-dir", help="입력 폴더")
     parser.add_argument("--output-dir", help="출력 폴더")
-    parser.add_argument("--style", choices=list(PersonalPhotoProcessor().styles.keys()), 
+    parser.add_argument("--style", choices=list(STYLES), 
                        default="artistic", help="스타일 선택")
     parser.add_argument("--prompt", help="커스텀 프롬프트")
     
@@ -360,14 +411,13 @@ def main():
             print("❌ CLI 모드에서는 --input-dir과 --output-dir이 필요합니다.")
             return 1
         
-        processor = PersonalPhotoProcessor()
         if args.style == "custom":
             if not args.prompt:
                 print("❌ 커스텀 스타일에서는 --prompt가 필요합니다.")
                 return 1
             prompt = args.prompt
         else:
-            prompt = processor.styles[args.style]
+            prompt = STYLES[args.style]
         
         # CLI로 직접 실행
         cmd = [